@@ -0,0 +1,107 @@
+"""
+LAN discovery against local stand-in listeners.
+
+Starts stand-in instruments on loopback addresses (127.0.0.<n>, Linux routes the whole
+127/8 to lo): VXI-11 portmappers, raw SCPI sockets, VICP sockets, and "silent" hosts
+that accept connections but never answer. Then scans 127.0.0.0/24 with the same
+per-host timeout as the GUI and checks that exactly the stand-ins were found.
+
+Usage:
+    python benchmarks/bench_discovery.py [--instruments 8] [--silent 8] [--timeout 0.5] [--base-port 21100]
+"""
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from discovery import discover, expand_targets, VXI11_CORE_PROGRAM  # noqa: E402
+
+IDN = "LECROY,STAND-IN,{host},1.0"
+
+
+async def portmapper(reader, writer):
+    call = await reader.readexactly(60)
+    xid, prog = struct.unpack_from('>I', call, 4)[0], struct.unpack_from('>I', call, 44)[0]
+    port = 1024 if prog == VXI11_CORE_PROGRAM else 0
+    writer.write(struct.pack('>8I', 0x80000000 | 28, xid, 1, 0, 0, 0, 0, port))
+    await writer.drain()
+    writer.close()
+
+
+async def scpi(reader, writer):
+    await reader.readline()
+    writer.write((IDN.format(host=writer.get_extra_info('sockname')[0]) + "\n").encode())
+    await writer.drain()
+    writer.close()
+
+
+async def vicp(reader, writer):
+    header = await reader.readexactly(8)
+    await reader.readexactly(struct.unpack('>I', header[4:])[0])
+    reply = IDN.format(host=writer.get_extra_info('sockname')[0]).encode() + b"\n"
+    writer.write(struct.pack('>BBBxI', 0x81, 1, 1, len(reply)) + reply)
+    await writer.drain()
+    writer.close()
+
+
+async def silent(reader, writer):
+    # Accepts but never answers: the prober has to run into its timeout and hang up
+    await reader.read()
+    writer.close()
+
+
+async def main_async(args):
+    ports = {'portmapper_port': args.base_port, 'scpi_port': args.base_port + 1, 'vicp_port': args.base_port + 2}
+    servers = []
+    expected = set()
+    kinds = [("VXI-11", portmapper, ports['portmapper_port']), ("SCPI", scpi, ports['scpi_port']), ("VICP", vicp, ports['vicp_port'])]
+    for i in range(args.instruments):
+        host = f"127.0.0.{10 + i}"
+        name, handler, port = kinds[i % len(kinds)]
+        servers.append(await asyncio.start_server(handler, host, port))
+        expected.add(host)
+    for i in range(args.silent):
+        host = f"127.0.0.{100 + i}"
+        for port in ports.values():
+            servers.append(await asyncio.start_server(silent, host, port))
+
+    hosts = expand_targets("127.0.0.0/24")
+    first_ms = []
+    t0 = time.perf_counter()
+
+    def on_found(result, done, total):
+        if result is not None:
+            first_ms.append((time.perf_counter() - t0) * 1000.0)
+            print(f"  {result['host']:<12} {'/'.join(result['via']):<8} {result['idn'] or '-'}  ({result['ms']:.1f} ms)")
+
+    found = await discover(hosts, on_found, timeout=args.timeout, **ports)
+    elapsed = time.perf_counter() - t0
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+
+    found_hosts = {r['host'] for r in found}
+    print(f"scanned {len(hosts)} hosts in {elapsed:.2f} s (timeout {args.timeout} s per probe), "
+          f"found {len(found)}, first result after {min(first_ms) if first_ms else 0:.1f} ms")
+    if found_hosts != expected:
+        print(f"MISMATCH: missing {sorted(expected - found_hosts)}, unexpected {sorted(found_hosts - expected)}")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instruments", type=int, default=8)
+    parser.add_argument("--silent", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    parser.add_argument("--base-port", type=int, default=21100)
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Microbenchmarks of the host-side code that runs on every frame and every sync.
+
+Cases use synthetic payloads of realistic size and run headless (offscreen Qt platform):
+  - screenshot: PNG header/footer search, decode, the whole get_screenshot path
+  - display:    MonitorWidget new frame (smooth / fast scaling) and cached repaint
+  - sync:       parse_num, set_combo_by_data, apply_synced_settings
+  - apply:      build_apply_commands (APPLY TO SCOPE)
+  - export:     export_waveform file write, write_bundle_entry (write + decode + .npy)
+
+Before timing, MeasurementHistory is checked against NumPy on a series with NaN / inf
+readings mixed in (they must be skipped).
+
+Results (median time per call) can be stored as a baseline; later runs flag every
+case that got slower than the baseline by more than --tolerance.
+
+Usage:
+    python benchmarks/bench_micro.py [--filter display] [--baseline FILE [--save-baseline]] [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import struct
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PyQt6.QtCore import QBuffer, QIODevice, QPointF  # noqa: E402
+from PyQt6.QtGui import QImage, QColor, QPainter, QPen, QPolygonF  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+
+from main_gui import OscilloscopeGUI, set_combo_by_data  # noqa: E402
+from measure_history import MeasurementHistory  # noqa: E402
+from scpi_values import parse_num  # noqa: E402
+from visa_worker import OscilloscopeWorker  # noqa: E402
+from waveform import write_bundle_entry  # noqa: E402
+from widgets import MonitorWidget  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_micro_baseline.json")
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+PNG_FOOTER = b'IEND\xaeB`\x82'
+
+
+def make_screen_dump(width=1280, height=800):
+    """SCDP-like response: block header + PNG of a scope screen (grid + four noisy traces)."""
+    img = QImage(width, height, QImage.Format.Format_RGB32)
+    img.fill(QColor("#000000"))
+    painter = QPainter(img)
+    painter.setPen(QPen(QColor("#404040"), 1))
+    for i in range(11):
+        painter.drawLine(int(i * width / 10), 0, int(i * width / 10), height)
+    for i in range(9):
+        painter.drawLine(0, int(i * height / 8), width, int(i * height / 8))
+    rng = np.random.default_rng(0)
+    x = np.arange(width)
+    for k, color in enumerate(["#f0e442", "#ff4fd8", "#56b4e9", "#3fb950"]):
+        y = height * (0.2 + 0.2 * k) + 40 * np.sin(x / (30.0 + 10 * k)) + rng.normal(0, 3, width)
+        painter.setPen(QPen(QColor(color), 1))
+        painter.drawPolyline(QPolygonF([QPointF(float(a), float(b)) for a, b in zip(x, y)]))
+    painter.end()
+    buf = QBuffer()
+    buf.open(QIODevice.OpenModeFlag.WriteOnly)
+    img.save(buf, "PNG")
+    png = bytes(buf.data())
+    return f"#9{len(png):09d}".encode() + png
+
+
+def make_waveform_response(points):
+    """`WAVEFORM? ALL`-like response: 346-byte WAVEDESC (little-endian, WORD) + samples."""
+    desc = bytearray(346)
+    desc[0:8] = b'WAVEDESC'
+    struct.pack_into('<h', desc, 32, 1)          # COMM_TYPE: word
+    struct.pack_into('<h', desc, 34, 1)          # COMM_ORDER: little-endian
+    struct.pack_into('<l', desc, 36, 346)        # WAVE_DESCRIPTOR length
+    struct.pack_into('<l', desc, 60, 2 * points)  # WAVE_ARRAY_1 length
+    struct.pack_into('<l', desc, 116, points)
+    struct.pack_into('<l', desc, 136, 1)
+    struct.pack_into('<f', desc, 156, 1e-4)
+    struct.pack_into('<f', desc, 176, 1e-9)
+    codes = (8000 * np.sin(np.arange(points) / 50.0)).astype('<i2')
+    return b'#9' + f"{346 + 2 * points:09d}".encode() + bytes(desc) + codes.tobytes()
+
+
+class PayloadInstrument:
+    """Zero-latency instrument that returns a fixed payload on every read_raw."""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.timeout = 5000
+
+    def write(self, cmd):
+        pass
+
+    def read_raw(self, *args):
+        return self.payload
+
+
+def time_case(func, min_sample_s=0.05, repeat=5):
+    """Median seconds per call, calibrating the loop count so each sample lasts >= min_sample_s."""
+    func()
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_sample_s or number >= 1 << 20:
+            break
+        number *= 2 if elapsed <= 0 else max(2, int(min_sample_s / elapsed * 1.2))
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - t0) / number)
+    return statistics.median(samples)
+
+
+def check_history():
+    """Returns a list of problems of MeasurementHistory on a series with invalid readings (empty if fine)."""
+    rng = np.random.default_rng(1)
+    values = rng.normal(1.0, 0.1, 500)
+    hist = MeasurementHistory(capacity=1000, window=100)
+    for i, v in enumerate(values):
+        hist.add(float(i), v)
+        if i % 50 == 0:
+            hist.add(float(i), np.nan)
+            hist.add(float(i), np.inf)
+    st = hist.stats()
+    last = values[-100:]
+    expected = {'mean': last.mean(), 'std': last.std(ddof=1), 'min': last.min(), 'max': last.max(),
+                'life_mean': values.mean(), 'life_std': values.std(ddof=1)}
+    problems = [f"{key}: {st[key]!r} != {want!r}" for key, want in expected.items()
+                if not np.isclose(st[key], want, rtol=1e-9)]
+    if st['total'] != len(values) or len(hist) != len(values):
+        problems.append(f"{st['total']} readings stored, expected {len(values)}")
+    return problems
+
+
+def build_cases(gui, tmp_dir):
+    cases = {}
+
+    dump = make_screen_dump()
+    png = dump[dump.find(PNG_HEADER):]
+
+    def png_search():
+        start = dump.find(PNG_HEADER)
+        return PNG_FOOTER in dump[start:][-30:]
+    cases['screenshot.png_search'] = png_search
+
+    def png_decode():
+        img = QImage.fromData(png)
+        img.convertTo(QImage.Format.Format_RGB32)
+    cases['screenshot.png_decode'] = png_decode
+
+    worker = OscilloscopeWorker()
+    worker.instrument = PayloadInstrument(dump)
+    worker._is_connected = True
+    worker._hardcopy_active = worker._hardcopy_setup
+    cases['screenshot.get_screenshot'] = worker.get_screenshot
+
+    frame = QImage.fromData(png)
+    frame.convertTo(QImage.Format.Format_RGB32)
+    monitor = MonitorWidget()
+    monitor.resize(900, 560)
+
+    def new_frame(fast):
+        monitor.set_fast(fast)
+        monitor.set_frame(frame)
+        monitor._render_cache(fast)
+    cases['display.new_frame_smooth'] = lambda: new_frame(False)
+    cases['display.new_frame_fast'] = lambda: new_frame(True)
+
+    def cached_repaint():
+        monitor.repaint()
+    monitor.show()
+    cases['display.cached_repaint'] = cached_repaint
+
+    replies = ["1.00E-06S", "5.00E-01V", "-1.2500E-01", "ON", "0.0E+00", "2.00E-03 V"] * 10
+    cases['sync.parse_num'] = lambda: [parse_num(r) for r in replies]
+    cases['sync.set_combo_by_data'] = lambda: set_combo_by_data(gui.timebase_cb, 1e-6)
+
+    settings = {'TIME_DIV': "1.00E-06S", 'TRIG_MODE': "AUTO", 'TRIG_TYPE': "EDGE", 'TRIG_SRC': "C1",
+                'TRIG_LVL': "1.00E-01V"}
+    for ch in ["C1", "C2", "C3", "C4"]:
+        settings.update({f'{ch}:TRACE': "ON", f'{ch}:VOLT_DIV': "5.00E-01V", f'{ch}:OFFSET': "0.0E+00V",
+                         f'{ch}:COUPLING': "D1M", f'{ch}:BANDWIDTH_LIMIT': "OFF", f'{ch}:INVERT': "OFF"})
+    cases['sync.apply_synced_settings'] = lambda: gui.apply_synced_settings(settings, quiet=True)
+
+    cases['apply.build_apply_commands'] = gui.build_apply_commands
+
+    raw = make_waveform_response(5_000_000)
+    export_worker = OscilloscopeWorker()
+    export_worker.instrument = PayloadInstrument(raw)
+    export_worker._is_connected = True
+    export_path = os.path.join(tmp_dir, "C1.bin")
+    cases['export.export_waveform_10MB'] = lambda: export_worker.export_waveform("C1", export_path)
+    cases['export.write_bundle_entry_10MB'] = lambda: write_bundle_entry("C1", raw, tmp_dir)
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run cases containing this text")
+    parser.add_argument("--baseline", help=f"baseline JSON (default {os.path.relpath(DEFAULT_BASELINE)})")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+    explicit_baseline = args.baseline is not None
+    args.baseline = args.baseline or DEFAULT_BASELINE
+    if explicit_baseline and not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"error: baseline {args.baseline} not found (create it with --baseline {args.baseline} --save-baseline)")
+        return 2
+
+    problems = check_history()
+    for p in problems:
+        print(f"CHECK FAILED: measurement history {p}")
+    if problems:
+        return 1
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    gui = OscilloscopeGUI()
+    gui.log = lambda *a, **k: None
+    tmp_dir = tempfile.mkdtemp(prefix="bench_micro_")
+    results = {}
+    try:
+        for name, func in build_cases(gui, tmp_dir).items():
+            if args.filter not in name: continue
+            results[name] = time_case(func) * 1e6
+            app.processEvents()
+    finally:
+        gui.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    elif not args.save_baseline:
+        # Baselines are machine-specific, so none is committed
+        print(f"warning: no baseline at {args.baseline}, nothing is compared. "
+              f"Record one on this machine with --save-baseline.")
+
+    regressions = []
+    for name, us in results.items():
+        line = f"{name:<36} {us:12.2f} us"
+        base = baseline.get(name)
+        if base:
+            ratio = us / base
+            line += f"   x{ratio:5.2f} vs baseline"
+            if ratio > 1.0 + args.tolerance:
+                line += "   REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if baseline:
+        missing = [name for name in results if name not in baseline]
+        if missing:
+            print(f"warning: {len(missing)} case(s) not in the baseline: {', '.join(missing)}")
+        print("no regressions" if not regressions else f"{len(regressions)} regression(s): {', '.join(regressions)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
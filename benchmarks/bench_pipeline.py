@@ -0,0 +1,81 @@
+"""
+Throughput of the process-pool analysis pipeline versus the number of workers.
+
+Submits synthetic deep records (measurements + FFT) through AnalysisPipeline and
+reports records/s and MSamples/s for 1..N workers, next to an in-process baseline.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--points 1000000] [--records 32] [--max-workers 8]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import wait
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import AnalysisPipeline, measure_waveform  # noqa: E402
+from spectrum import rms_spectrum  # noqa: E402
+from waveform import Waveform  # noqa: E402
+
+TASKS = ('measure', 'spectrum')
+
+
+def make_records(points, records):
+    rng = np.random.default_rng(0)
+    t = np.arange(points, dtype=np.float32)
+    base = np.sin(2 * np.pi * t / 1000.0).astype(np.float32)
+    return [Waveform(f"C{i % 4 + 1}", base + rng.normal(0, 0.05, points).astype(np.float32), 1e-9, 0.0)
+            for i in range(records)]
+
+
+def run_pipeline(wfs, workers):
+    pipe = AnalysisPipeline(workers=workers, max_in_flight=len(wfs))
+    try:
+        # Warm-up: start every process and import numpy there
+        wait([pipe.submit(wfs[0], TASKS) for _ in range(workers)])
+        t0 = time.perf_counter()
+        futures = [pipe.submit(wf, TASKS) for wf in wfs]
+        wait(futures)
+        elapsed = time.perf_counter() - t0
+        for f in futures:
+            f.result()
+        return elapsed
+    finally:
+        pipe.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=1000000)
+    parser.add_argument("--records", type=int, default=32)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    wfs = make_records(args.points, args.records)
+    total = args.points * args.records
+
+    t0 = time.perf_counter()
+    for wf in wfs:
+        measure_waveform(wf.volts, wf.dt)
+        rms_spectrum(wf.volts, wf.dt)
+    baseline = time.perf_counter() - t0
+    cores = os.cpu_count() or 1
+    print(f"{args.records} records x {args.points} points, tasks: {', '.join(TASKS)}, {cores} CPU core(s)")
+    if cores < 2:
+        print("note: a single core cannot show a speedup, only the pipeline overhead")
+    print(f"{'in-process':>12}: {args.records / baseline:8.2f} rec/s  {total / baseline / 1e6:8.2f} MS/s")
+
+    workers = 1
+    while workers <= args.max_workers:
+        elapsed = run_pipeline(wfs, workers)
+        print(f"{workers:>4} workers: {args.records / elapsed:8.2f} rec/s  {total / elapsed / 1e6:8.2f} MS/s"
+              f"  (x{baseline / elapsed:.2f})")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Replays a recorded VISA session (File > Record VISA Session...) against the current
+OscilloscopeWorker and reports live-view frame rate and settings sync times, so
+different versions of the worker can be compared on the same instrument timing.
+
+The scenario is the live loop: screenshots, incremental change checks every
+fifth frame, and full SYNC FROM SCOPE sweeps. Requests that are missing from the
+recording are counted as misses (a query miss is served as a VISA timeout).
+
+Before replaying, it checks that a recording started on an already open connection
+replays on its own (connects without misses).
+
+Usage:
+    python benchmarks/bench_replay.py SESSION.visarec [--scale 1 0] [--frames 50] [--syncs 5]
+                                      [--baseline FILE [--save-baseline]] [--tolerance 0.10]
+    python benchmarks/bench_replay.py SESSION.visarec --record-synthetic [--latency-ms 2.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtCore import QBuffer, QIODevice  # noqa: E402
+from PyQt6.QtGui import QImage, QColor  # noqa: E402
+
+from session_record import RecordingInstrument, load_session, session_summary  # noqa: E402
+from visa_worker import OscilloscopeWorker, HARDCOPY_FULL  # noqa: E402
+
+
+class SimulatedScope:
+    """Synthetic instrument for --record-synthetic: fixed latency per message, PNG screen dumps."""
+
+    def __init__(self, latency_s, bytes_per_s=12.5e6):
+        self.latency_s = latency_s
+        self.bytes_per_s = bytes_per_s
+        self.timeout = 5000
+        img = QImage(1024, 768, QImage.Format.Format_RGB32)
+        img.fill(QColor("#102030"))
+        buf = QBuffer()
+        buf.open(QIODevice.OpenModeFlag.WriteOnly)
+        img.save(buf, "PNG")
+        self.png = b'#9' + b'0' * 9 + bytes(buf.data())
+
+    def _link(self, n_bytes):
+        time.sleep(self.latency_s + n_bytes / self.bytes_per_s)
+
+    def _answer(self, key):
+        if key == '*IDN': return "LECROY,SIMULATED,0,0"
+        if key == 'TIME_DIV': return "1E-06"
+        if key.endswith(':TRACE'): return "ON"
+        if key.endswith(':COUPLING'): return "D1M"
+        if key.endswith(':BANDWIDTH_LIMIT') or key.endswith(':INVERT'): return "OFF"
+        if key == 'TRIG_MODE': return "AUTO"
+        if key == 'TRIG_SELECT': return "EDGE,SR,C1,HT,OFF"
+        return "0"
+
+    def clear(self):
+        self._link(0)
+
+    def write(self, cmd):
+        self._link(len(cmd))
+
+    def query(self, cmd):
+        reply = ';'.join(self._answer(part.rstrip('?')) for part in cmd.split(';')) + "\n"
+        self._link(len(cmd) + len(reply))
+        return reply
+
+    def read_raw(self, *args):
+        self._link(len(self.png))
+        return self.png
+
+    def close(self):
+        pass
+
+
+def run_scenario(worker, frames, syncs):
+    """Live loop (screenshot + change check every 5th frame) followed by full syncs. Times in ms."""
+    frame_ms, check_ms, sync_ms = [], [], []
+    t_start = time.perf_counter()
+    for i in range(frames):
+        t0 = time.perf_counter()
+        worker.get_screenshot()
+        frame_ms.append((time.perf_counter() - t0) * 1000.0)
+        if i % 5 == 4:
+            t0 = time.perf_counter()
+            worker.check_settings_changed()
+            check_ms.append((time.perf_counter() - t0) * 1000.0)
+    live_s = time.perf_counter() - t_start
+    for _ in range(syncs):
+        t0 = time.perf_counter()
+        worker.fetch_all_settings()
+        sync_ms.append((time.perf_counter() - t0) * 1000.0)
+    return {
+        'fps': frames / live_s if live_s > 0 else 0.0,
+        'frame_ms': statistics.median(frame_ms) if frame_ms else 0.0,
+        'check_ms': statistics.median(check_ms) if check_ms else 0.0,
+        'sync_ms': statistics.median(sync_ms) if sync_ms else 0.0,
+    }
+
+
+def record_synthetic(path, latency_ms, frames, syncs):
+    worker = OscilloscopeWorker()
+    worker.instrument = RecordingInstrument(SimulatedScope(latency_ms / 1000.0), path)
+    worker._is_connected = True
+    # Same opening sequence as connect_to_scope
+    worker.instrument.clear()
+    worker.instrument.query('*IDN?')
+    worker.instrument.write('COMM_HEADER OFF')
+    worker.instrument.write(HARDCOPY_FULL)
+    worker._hardcopy_active = HARDCOPY_FULL
+    # Cover both the compound fingerprint and the per-setting fallback queries
+    worker._read_settings()
+    run_scenario(worker, frames, syncs)
+    worker.instrument.stop()
+
+
+def check_mid_session(frames=5):
+    """Records part of an open session and replays it. Returns a list of problems (empty if fine)."""
+    fd, path = tempfile.mkstemp(suffix=".visarec")
+    os.close(fd)
+    try:
+        worker = OscilloscopeWorker()
+        worker.instrument = SimulatedScope(0.0)
+        worker._is_connected = True
+        worker._idn = "LECROY,SIMULATED,0,0\n"
+        worker._hardcopy_active = HARDCOPY_FULL
+        worker.get_screenshot()  # traffic before the recording starts
+        worker.set_session_recording(path)
+        run_scenario(worker, frames, 1)
+        worker.set_session_recording("")
+
+        replay = OscilloscopeWorker()
+        errors, idn = [], []
+        replay.error.connect(errors.append)
+        replay.connected.connect(idn.append)
+        replay.connect_to_scope(f"replay@0:{path}")
+        if not replay._is_connected:
+            return [f"connect failed: {errors}"]
+        problems = []
+        if idn != ["LECROY,SIMULATED,0,0"]:
+            problems.append(f"replayed *IDN? is {idn}")
+        replay.get_screenshot()
+        if replay.instrument.misses:
+            problems.append(f"{replay.instrument.misses} miss(es) after connecting")
+        return problems
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("session")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1.0, 0.0], help="latency scales to replay with")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--syncs", type=int, default=5)
+    parser.add_argument("--baseline", help="JSON file with previous results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown")
+    parser.add_argument("--record-synthetic", action="store_true", help="create SESSION from a simulated scope")
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    problems = check_mid_session()
+    for p in problems:
+        print(f"CHECK FAILED: mid-session recording {p}")
+    if problems:
+        return 1
+    print("mid-session recording: replay OK")
+
+    if args.record_synthetic:
+        record_synthetic(args.session, args.latency_ms, args.frames, args.syncs)
+
+    summary = session_summary(load_session(args.session))
+    print(f"session {os.path.basename(args.session)}: " + ", ".join(
+        f"{op} {s['count']} ({s['bytes'] / 1e6:.2f} MB, {s['seconds']:.2f} s)" for op, s in summary.items()))
+
+    results = {}
+    for scale in args.scale:
+        worker = OscilloscopeWorker()
+        errors = []
+        worker.error.connect(errors.append)
+        worker.connect_to_scope(f"replay@{scale:g}:{args.session}")
+        if not worker._is_connected:
+            print(f"scale {scale:g}: connect failed: {errors}")
+            return 1
+        result = run_scenario(worker, args.frames, args.syncs)
+        result['misses'] = worker.instrument.misses
+        results[f"x{scale:g}"] = result
+        print(f"latency x{scale:<4g} {result['fps']:7.2f} fps   frame {result['frame_ms']:8.2f} ms   "
+              f"change check {result['check_ms']:7.2f} ms   full sync {result['sync_ms']:8.2f} ms   "
+              f"misses {result['misses']}")
+
+    if not args.baseline:
+        return 0
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base: continue
+        if result['fps'] < base['fps'] * (1.0 - args.tolerance):
+            regressions.append(f"{key}: {result['fps']:.2f} fps vs {base['fps']:.2f}")
+        for metric in ('frame_ms', 'check_ms', 'sync_ms'):
+            # Sub-millisecond timings are noise at zero latency
+            if result[metric] > max(base[metric] * (1.0 + args.tolerance), base[metric] + 1.0):
+                regressions.append(f"{key}: {metric} {result[metric]:.2f} vs {base[metric]:.2f}")
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    print("no regressions" if not regressions else f"{len(regressions)} regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
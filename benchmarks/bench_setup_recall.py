@@ -0,0 +1,151 @@
+"""
+Recall latency harness for the setup library.
+
+Drives OscilloscopeWorker.recall_setup against a simulated instrument with a
+configurable per-message latency and link bandwidth, and compares:
+  - full apply (every setting, as APPLY TO SCOPE does)
+  - small diff (only the changed settings)
+  - panel setup blob (one transfer)
+
+Before timing, it checks that a diff recall planned from unit-suffixed replies
+('5.00E-01V', as the instrument answers) reaches the worker without errors.
+
+Usage:
+    python benchmarks/bench_setup_recall.py [--latency-ms 2.0] [--mbps 100] [--blob-kb 40] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from setup_library import SetupLibrary, plan_recall, settings_to_commands  # noqa: E402
+from visa_worker import OscilloscopeWorker  # noqa: E402
+
+
+class SimulatedInstrument:
+    """Answers like a scope with a fixed round-trip latency per message and a finite link bandwidth."""
+
+    def __init__(self, latency_s, bytes_per_s):
+        self.latency_s = latency_s
+        self.bytes_per_s = bytes_per_s
+        self.timeout = 5000
+
+    def _link(self, n_bytes):
+        time.sleep(self.latency_s + n_bytes / self.bytes_per_s)
+
+    def write(self, cmd):
+        self._link(len(cmd))
+
+    def write_raw(self, data):
+        self._link(len(data))
+
+    def query(self, cmd):
+        self._link(len(cmd))
+        return "D1M\n" if cmd.endswith("COUPLING?") else "0\n"
+
+
+def make_settings(volt_div="1"):
+    s = {'TIME_DIV': "1E-06", 'TRIG_MODE': "AUTO", 'TRIG_TYPE': "EDGE", 'TRIG_SRC': "C1", 'TRIG_LVL': "0.1"}
+    for ch in ["C1", "C2", "C3", "C4"]:
+        s.update({f'{ch}:TRACE': "ON", f'{ch}:VOLT_DIV': volt_div, f'{ch}:OFFSET': "0",
+                  f'{ch}:COUPLING': "D1M", f'{ch}:BANDWIDTH_LIMIT': "OFF", f'{ch}:INVERT': "OFF"})
+    return s
+
+
+def make_replies(volt_div="1.00E+00V"):
+    """Settings as the instrument reports them: numeric values carry a unit suffix."""
+    s = {'TIME_DIV': "1.00E-06S", 'TRIG_MODE': "AUTO", 'TRIG_TYPE': "EDGE", 'TRIG_SRC': "C1", 'TRIG_LVL': "1.00E-01V"}
+    for ch in ["C1", "C2", "C3", "C4"]:
+        s.update({f'{ch}:TRACE': "ON", f'{ch}:VOLT_DIV': volt_div, f'{ch}:OFFSET': "0.00E+00V",
+                  f'{ch}:COUPLING': "D1M", f'{ch}:BANDWIDTH_LIMIT': "OFF", f'{ch}:INVERT': "OFF"})
+    return s
+
+
+def check_unit_suffixes(worker):
+    """Returns a list of problems with recalls planned from unit-suffixed replies (empty if fine)."""
+    problems = []
+    if plan_recall(make_replies(), make_settings(), False):
+        problems.append("'1.00E+00V' and '1' are planned as different values")
+    target = make_replies()
+    target['C1:VOLT_DIV'] = "5.00E-01V"
+    target['C2:OFFSET'] = "-2.50E-02V"
+    target['TIME_DIV'] = "1.00E-03S"
+    target['TRIG_LVL'] = "2.00E-01V"
+    cmds = plan_recall(make_replies(), target, False)
+    if len(cmds) != 4 or any(c[-1].isalpha() for c in cmds):
+        problems.append(f"unexpected diff commands: {cmds}")
+    errors, done = [], []
+    worker.error.connect(errors.append)
+    worker.setup_recalled.connect(lambda name, mode, ms: done.append(mode))
+    worker.recall_setup(cmds, b'', "check")
+    worker.error.disconnect(errors.append)
+    worker.setup_recalled.disconnect()
+    if errors or not done:
+        problems.append(f"recall failed: {errors}")
+    return problems
+
+
+def measure(worker, cmds, blob, repeat):
+    samples = []
+    worker.setup_recalled.connect(lambda name, mode, ms: samples.append(ms))
+    for _ in range(repeat):
+        worker.recall_setup(cmds, blob)
+    worker.setup_recalled.disconnect()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--mbps", type=float, default=100.0)
+    parser.add_argument("--blob-kb", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    worker = OscilloscopeWorker()
+    worker.instrument = SimulatedInstrument(args.latency_ms / 1000.0, args.mbps * 1e6 / 8)
+    worker._is_connected = True
+    problems = check_unit_suffixes(worker)
+    for p in problems:
+        print(f"CHECK FAILED: {p}")
+    if problems:
+        return 1
+    print("unit-suffixed replies: diff recall OK")
+    worker.error.connect(lambda e: print(f"worker error: {e}"))
+
+    current = make_settings()
+    target = make_settings()
+    target['C1:VOLT_DIV'] = "0.5"
+    target['TIME_DIV'] = "1E-03"
+    blob = os.urandom(args.blob_kb * 1024)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library = SetupLibrary(tmp)
+        library.save("bench", target, {}, blob)
+        t0 = time.perf_counter()
+        snapshot = SetupLibrary(tmp).load("bench")
+        cold_load_ms = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        diff_cmds = plan_recall(current, snapshot['settings'], True)
+        plan_ms = (time.perf_counter() - t0) * 1000.0
+
+    full_cmds = settings_to_commands(target, target.keys())
+    scenarios = [
+        (f"full apply ({len(full_cmds)} cmds)", full_cmds, b''),
+        (f"diff ({len(diff_cmds)} cmds)", diff_cmds, b''),
+        (f"blob ({args.blob_kb} kB)", [], blob),
+    ]
+
+    print(f"link: {args.latency_ms} ms/message, {args.mbps} Mbit/s | library load {cold_load_ms:.2f} ms, plan {plan_ms:.3f} ms")
+    for label, cmds, data in scenarios:
+        samples = measure(worker, cmds, data, args.repeat)
+        print(f"{label:<24} median {statistics.median(samples):8.2f} ms   max {max(samples):8.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import asyncio
+import ipaddress
+import struct
+import time
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+
+PORTMAPPER_PORT = 111
+VXI11_CORE_PROGRAM = 0x0607AF
+SCPI_RAW_PORT = 5025
+VICP_PORT = 1861
+MAX_HOSTS = 4096
+
+# ONC RPC over TCP: record mark + CALL portmapper(100000) v2 GETPORT(3), no credentials,
+# args: VXI-11 core program, version 1, protocol TCP (6), port 0
+_RPC_XID = 0x4F534331
+_GETPORT_CALL = struct.pack('>15I', 0x80000000 | 56, _RPC_XID, 0, 2, 100000, 2, 3,
+                            0, 0, 0, 0, VXI11_CORE_PROGRAM, 1, 6, 0)
+# VICP header: operation (DATA | EOI), version 1, sequence, spare, payload length
+_VICP_HEADER = struct.Struct('>BBBxI')
+
+
+def expand_targets(spec):
+    """
+    Hosts to probe from a comma-separated list of addresses, networks ('10.0.10.0/24')
+    and last-octet ranges ('10.0.10.20-60'). Raises ValueError on bad input or too many hosts.
+    """
+    hosts = []
+    for part in (p.strip() for p in spec.split(',')):
+        if not part:
+            continue
+        if '/' in part:
+            net = ipaddress.ip_network(part, strict=False)
+            hosts.extend(str(h) for h in (net.hosts() if net.num_addresses > 2 else net))
+        elif '-' in part:
+            first, last = (p.strip() for p in part.rsplit('-', 1))
+            start = int(ipaddress.IPv4Address(first))
+            end = int(ipaddress.IPv4Address(last)) if '.' in last else (start & ~0xFF) | int(last)
+            if end < start or end - start > MAX_HOSTS:
+                raise ValueError(f"Bad address range: {part}")
+            hosts.extend(str(ipaddress.IPv4Address(i)) for i in range(start, end + 1))
+        else:
+            hosts.append(part)
+        if len(hosts) > MAX_HOSTS:
+            raise ValueError(f"Too many hosts (max {MAX_HOSTS}).")
+    return list(dict.fromkeys(hosts))
+
+
+async def _open(host, port, timeout):
+    return await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+
+
+async def _close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (OSError, ConnectionError):
+        pass
+
+
+async def probe_portmapper(host, port=PORTMAPPER_PORT, timeout=0.5):
+    """Asks the portmapper for the VXI-11 core port. Returns it, or None if there is no VXI-11 service."""
+    try:
+        reader, writer = await _open(host, port, timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        writer.write(_GETPORT_CALL)
+        await asyncio.wait_for(writer.drain(), timeout)
+        reply = await asyncio.wait_for(reader.readexactly(32), timeout)
+        _, xid, msg_type, reply_stat, _, verf_len, accept_stat, vxi_port = struct.unpack('>8I', reply)
+        if xid != _RPC_XID or msg_type != 1 or reply_stat != 0 or verf_len != 0 or accept_stat != 0:
+            return None
+        return vxi_port or None
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, struct.error):
+        return None
+    finally:
+        await _close(writer)
+
+
+async def probe_idn(host, port, timeout=0.5, vicp=False):
+    """Sends *IDN? over a raw SCPI socket (or LeCroy VICP). Returns the reply, or None."""
+    try:
+        reader, writer = await _open(host, port, timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        if vicp:
+            payload = b'*IDN?\n'
+            writer.write(_VICP_HEADER.pack(0x81, 1, 1, len(payload)) + payload)
+            await asyncio.wait_for(writer.drain(), timeout)
+            header = await asyncio.wait_for(reader.readexactly(_VICP_HEADER.size), timeout)
+            length = _VICP_HEADER.unpack(header)[3]
+            reply = await asyncio.wait_for(reader.readexactly(min(length, 1024)), timeout)
+        else:
+            writer.write(b'*IDN?\n')
+            await asyncio.wait_for(writer.drain(), timeout)
+            reply = await asyncio.wait_for(reader.readline(), timeout)
+        text = reply.decode('ascii', errors='replace').strip()
+        return text or None
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, struct.error):
+        return None
+    finally:
+        await _close(writer)
+
+
+async def probe_host(host, timeout=0.5, portmapper_port=PORTMAPPER_PORT, scpi_port=SCPI_RAW_PORT, vicp_port=VICP_PORT):
+    """
+    Probes one host: VXI-11 portmapper, raw SCPI and VICP concurrently. Returns a result
+    dict (host, vxi11_port, idn, via, ms) if anything answered, otherwise None.
+    """
+    t0 = time.perf_counter()
+    probes = [probe_portmapper(host, portmapper_port, timeout)]
+    if scpi_port:
+        probes.append(probe_idn(host, scpi_port, timeout))
+    if vicp_port:
+        probes.append(probe_idn(host, vicp_port, timeout, vicp=True))
+    vxi_port, *idns = await asyncio.gather(*probes)
+    via = [name for name, idn in zip(["SCPI", "VICP"], idns) if idn]
+    if vxi_port is None and not via:
+        return None
+    return {
+        'host': host,
+        'vxi11_port': vxi_port,
+        'idn': next((idn for idn in idns if idn), ""),
+        'via': (["VXI-11"] if vxi_port else []) + via,
+        'ms': (time.perf_counter() - t0) * 1000.0,
+    }
+
+
+async def discover(hosts, on_found=None, timeout=0.5, concurrency=256, cancelled=None, **ports):
+    """
+    Probes every host with at most `concurrency` connections in flight. Each result is
+    passed to on_found(result, done, total) as soon as its host finishes (result is None
+    for silent hosts). `cancelled()` is polled to stop early. Returns the found results.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    found = []
+    done = 0
+
+    async def run(host):
+        nonlocal done
+        result = None
+        try:
+            async with sem:
+                if cancelled is None or not cancelled():
+                    result = await probe_host(host, timeout, **ports)
+        finally:
+            # Skipped (cancelled) and failed hosts count as done too, so progress reaches the total
+            done += 1
+            if result is not None:
+                found.append(result)
+            if on_found is not None:
+                on_found(result, done, len(hosts))
+
+    await asyncio.gather(*(run(h) for h in hosts))
+    return found
+
+
+class DiscoveryWorker(QObject):
+    """Runs a LAN scan on its own QThread (one asyncio event loop per scan) and streams the results."""
+    found = pyqtSignal(dict)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int, float)
+    error = pyqtSignal(str)
+
+    def __init__(self, timeout=0.5):
+        super().__init__()
+        self.timeout = timeout
+        self._cancel = False
+
+    def cancel(self):
+        # Called directly from the GUI thread: the worker thread is inside asyncio.run
+        self._cancel = True
+
+    @pyqtSlot(str)
+    def scan(self, spec):
+        self._cancel = False
+        try:
+            hosts = expand_targets(spec)
+        except ValueError as e:
+            self.error.emit(f"Error in discovery scan: {str(e)}")
+            return
+
+        def on_found(result, done, total):
+            if result is not None:
+                self.found.emit(result)
+            self.progress.emit(done, total)
+
+        t0 = time.perf_counter()
+        try:
+            results = asyncio.run(discover(hosts, on_found, self.timeout, cancelled=lambda: self._cancel))
+        except Exception as e:
+            self.error.emit(f"System Error in discovery scan: {str(e)}")
+            return
+        self.finished.emit(len(results), time.perf_counter() - t0)
@@ -1,28 +1,75 @@
 import sys
 import os
 import time
+import math
+import ipaddress
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QGridLayout, QGroupBox, QLabel, QLineEdit, 
                              QPushButton, QComboBox, QDoubleSpinBox, QTextEdit, 
                              QScrollArea, QCheckBox, QTableWidget, 
                              QTableWidgetItem, QHeaderView, QFileDialog, QSizePolicy,
-                             QStatusBar)
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QThread
+                             QStatusBar, QTabWidget, QInputDialog)
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QThread, QMetaObject
 from PyQt6.QtGui import QPixmap, QImage, QAction
 
-from visa_worker import OscilloscopeWorker
-from widgets import ChannelControl
-from styles import STYLE_MAIN
+from visa_worker import OscilloscopeWorker, ControlWorker
+from widgets import ChannelControl, WaveformPlot, MonitorWidget, DiscoveryDialog
+from styles import STYLE_MAIN, TRACE_COLORS
+from setup_library import SetupLibrary, plan_recall
+from stream_server import StreamPublisher, DEFAULT_STREAM_PORT
+from measure_history import MeasurementHistory, export_histories
+from measure_logger import MeasurementLogger
+from spectrum import SpectrumAnalyzer, WINDOWS, SCALES, AVERAGING, to_scale, decimate_peaks, get_freqs
+from persistence import PersistenceEngine
+from pipeline import AnalysisPipeline, measure_waveform
+from math_channels import MathEngine, MATH_CHANNELS, write_math_bundle
+from session_record import parse_replay_address
+from discovery import DiscoveryWorker
+from scpi_values import parse_num
+
+
+def set_combo_by_data(cb, val):
+    """Selects the item whose numeric data is closest to val, without emitting signals."""
+    min_diff = float('inf'); best_idx = -1
+    for i in range(cb.count()):
+        try:
+            cbd = float(cb.itemData(i))
+            if abs(cbd - val) < min_diff: min_diff = abs(cbd - val); best_idx = i
+        except: pass
+    if best_idx >= 0 and cb.currentIndex() != best_idx:
+        cb.blockSignals(True); cb.setCurrentIndex(best_idx); cb.blockSignals(False)
+
+
+def set_combo_by_text(cb, text):
+    """Selects the item matching text (case-insensitive), without emitting signals."""
+    if not text: return
+    best_idx = -1
+    for i in range(cb.count()):
+        if cb.itemText(i).upper() == text.upper(): best_idx = i; break
+    if best_idx >= 0 and cb.currentIndex() != best_idx:
+        cb.blockSignals(True); cb.setCurrentIndex(best_idx); cb.blockSignals(False)
 
 class OscilloscopeGUI(QMainWindow):
-    request_connect = pyqtSignal(str)
-    request_screenshot = pyqtSignal(tuple)
+    request_connect = pyqtSignal(str, int)
+    request_screenshot = pyqtSignal()
+    request_compact_hardcopy = pyqtSignal(bool)
     request_measurements = pyqtSignal(list)
+    request_measure_values = pyqtSignal(list)
     request_sync = pyqtSignal()
+    request_change_check = pyqtSignal()
     request_command = pyqtSignal(str)
     request_multiple_commands = pyqtSignal(list)
     request_waveform = pyqtSignal(str, str)
+    request_export_all = pyqtSignal(list, str, dict, dict)
+    request_waveform_preview = pyqtSignal(list, int, float, float, bool)
+    request_waveform_window = pyqtSignal(list, int, int, int, str, bool)
+    request_capture_setup = pyqtSignal(str)
+    request_recall_setup = pyqtSignal(list, bytes, str)
     request_cleanup = pyqtSignal()
+    request_session_recording = pyqtSignal(str)
+    request_control_connect = pyqtSignal(str)
+    request_control_command = pyqtSignal(str)
+    request_discovery = pyqtSignal(str)
 
     def __init__(self):
         super().__init__()
@@ -32,8 +79,22 @@ class OscilloscopeGUI(QMainWindow):
         self._live_active = False
         self._is_gui_updating = False
         self._is_syncing = False
+        self._pending_recalls = {}   # setup name -> settings, applied once the worker confirms the recall
+        self._discovered = {}        # host -> LAN scan result
         self.screenshot_count = 0
+        self._frame_request_t = None
+        self._frame_time_avg = None
+        self.measure_history = {}
+        self.measure_logger = None
+        self.spectrum = SpectrumAnalyzer()
+        self.persistence = PersistenceEngine()
+        self.pipeline = None
+        self.math = MathEngine()
+        self._log_pending = False
         self.screenshot_dir = os.path.join(os.path.expanduser("~"), "Desktop", "Screenshots_Oscilloscope")
+        self.waveform_dir = os.path.join(os.path.expanduser("~"), "Desktop", "Waveforms_Oscilloscope")
+        self.setup_library = SetupLibrary(os.path.join(os.path.expanduser("~"), "Desktop", "Oscilloscope_Setups"))
+        self._scope_state = {}
         self.log_dir = os.path.join(os.path.expanduser("~"), "Desktop", "Oscilloscope_Logs")
         self.log_file_path = os.path.join(self.log_dir, f"session_{time.strftime('%Y%m%d_%H%M%S')}.log")
         
@@ -49,28 +110,72 @@ class OscilloscopeGUI(QMainWindow):
         self.worker.connected.connect(self.on_connected)
         self.worker.error.connect(self.on_error)
         self.worker.screenshot_ready.connect(self.display_screenshot)
+        self.worker.screenshot_data.connect(self.on_screenshot_data)
         self.worker.measure_ready.connect(self.update_measures_table)
+        self.worker.measure_values_ready.connect(self.on_measure_values)
         self.worker.export_finished.connect(lambda m: self.log(m))
-        self.worker.settings_ready.connect(self.apply_synced_settings)
+        self.worker.settings_ready.connect(self.on_settings_ready)
+        self.worker.settings_changed.connect(self.on_settings_changed)
         self.worker.response.connect(self.update_status_bar)
         self.worker.refresh_cycle_complete.connect(self.on_refresh_done)
         self.worker.busy_state.connect(self.on_worker_busy)
+        self.worker.waveform_ready.connect(self.on_waveform_ready)
+        self.worker.setup_captured.connect(self.on_setup_captured)
+        self.worker.setup_recalled.connect(self.on_setup_recalled)
 
         self.request_connect.connect(self.worker.connect_to_scope)
         self.request_screenshot.connect(self.worker.get_screenshot)
+        self.request_compact_hardcopy.connect(self.worker.set_compact_hardcopy)
+        self.request_session_recording.connect(self.worker.set_session_recording)
         self.request_measurements.connect(self.worker.fetch_measurements)
+        self.request_measure_values.connect(self.worker.read_measurement_values)
         self.request_sync.connect(self.worker.fetch_all_settings)
+        self.request_change_check.connect(self.worker.check_settings_changed)
         self.request_command.connect(self.worker.send_command)
         self.request_multiple_commands.connect(self.worker.send_multiple_commands)
         self.request_waveform.connect(self.worker.export_waveform)
+        self.request_export_all.connect(self.worker.export_all_waveforms)
+        self.request_waveform_preview.connect(self.worker.fetch_waveform_previews)
+        self.request_waveform_window.connect(self.worker.fetch_waveforms)
+        self.request_capture_setup.connect(self.worker.capture_setup)
+        self.request_recall_setup.connect(self.worker.recall_setup)
         self.request_cleanup.connect(self.worker.cleanup)
 
         self.worker_thread.start()
+
+        # Second VISA session on its own thread, reserved for short control commands
+        self.control_thread = QThread()
+        self.control_worker = ControlWorker()
+        self.control_worker.moveToThread(self.control_thread)
+        self.control_worker.connected.connect(lambda ip: self.log(f"Control session ready on {ip}."))
+        self.control_worker.error.connect(lambda e: self.log(e, True))
+        self.control_worker.control_ack.connect(self.on_control_ack)
+        self.request_control_connect.connect(self.control_worker.connect_to_scope)
+        self.request_control_command.connect(self.control_worker.send_control)
+        self.control_thread.start()
+
+        # LAN scan for instruments, asyncio inside its own thread
+        self.discovery_thread = QThread()
+        self.discovery_worker = DiscoveryWorker()
+        self.discovery_worker.moveToThread(self.discovery_thread)
+        self.request_discovery.connect(self.discovery_worker.scan)
+        self.discovery_thread.start()
         # ---------------------------------------------------------
 
+        self.publisher = StreamPublisher(parent=self)
+        self.publisher.error.connect(lambda m: self.log(m, True))
+        self.publisher.clients_changed.connect(lambda n: self.log(f"Stream subscribers: {n}"))
+        self.worker.screenshot_data.connect(self.publisher.publish_screenshot)
+        self.worker.measure_ready.connect(self.publisher.publish_measurements)
+        self.worker.waveform_ready.connect(self.publisher.publish_waveform)
+
         self.live_timer = QTimer()
         self.live_timer.setSingleShot(True) 
         self.live_timer.timeout.connect(self.on_live_tick)
+
+        self.logger_timer = QTimer()
+        self.logger_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.logger_timer.timeout.connect(self.on_logger_tick)
         
         self.sync_counter = 0
 
@@ -87,12 +192,30 @@ class OscilloscopeGUI(QMainWindow):
         save_img_action = QAction("Save Screenshot", self)
         save_img_action.triggered.connect(self.save_screenshot_to_file)
         file_menu.addAction(save_img_action)
+        file_menu.addAction("Export All Enabled Channels", self.save_all_waveforms)
+        file_menu.addSeparator()
+        self.record_action = QAction("Record VISA Session...", self)
+        self.record_action.setCheckable(True)
+        self.record_action.toggled.connect(self.toggle_session_recording)
+        file_menu.addAction(self.record_action)
+        file_menu.addAction("Replay VISA Session...", self.replay_session)
+        file_menu.addSeparator()
         file_menu.addAction("Exit", self.close)
         
         setup_menu = menubar.addMenu("Setup")
         setup_menu.addAction("Export Device Setup", self.export_setup)
         setup_menu.addAction("Import Device Setup", self.import_setup)
         
+        share_menu = menubar.addMenu("Share")
+        self.stream_action = QAction(f"Stream Server (port {DEFAULT_STREAM_PORT})", self)
+        self.stream_action.setCheckable(True)
+        self.stream_action.toggled.connect(self.toggle_stream_server)
+        share_menu.addAction(self.stream_action)
+        self.stream_lan_action = QAction("Allow LAN Subscribers (no authentication)", self)
+        self.stream_lan_action.setCheckable(True)
+        self.stream_lan_action.toggled.connect(self.on_stream_lan_toggled)
+        share_menu.addAction(self.stream_lan_action)
+
         info_menu = menubar.addMenu("Info")
         info_menu.addAction("About", lambda: self.log("Professional Oscilloscope Suite v2.1"))
 
@@ -112,7 +235,12 @@ class OscilloscopeGUI(QMainWindow):
         c_lay.addLayout(hb_lay, 0, 0, 1, 2)
         
         self.ip_input = QLineEdit("10.0.10.142")
-        c_lay.addWidget(QLabel("IP:"), 1, 0); c_lay.addWidget(self.ip_input, 1, 1)
+        ip_lay = QHBoxLayout()
+        ip_lay.addWidget(self.ip_input)
+        self.find_btn = QPushButton("FIND"); self.find_btn.setToolTip("Scan the LAN for instruments")
+        self.find_btn.clicked.connect(self.find_instruments)
+        ip_lay.addWidget(self.find_btn)
+        c_lay.addWidget(QLabel("IP:"), 1, 0); c_lay.addLayout(ip_lay, 1, 1)
         self.connect_btn = QPushButton("CONNECT"); self.connect_btn.setObjectName("connect_btn")
         self.connect_btn.clicked.connect(self.toggle_connection)
         c_lay.addWidget(self.connect_btn, 2, 0, 1, 2)
@@ -170,6 +298,10 @@ class OscilloscopeGUI(QMainWindow):
         for i, m in enumerate(["AUTO", "NORM", "SINGLE", "STOP"]):
             btn = QPushButton(m); btn.clicked.connect(lambda checked, mode=m: self.set_trigger_mode(mode))
             qa_lay.addWidget(btn, i//2, i%2)
+        clear_btn = QPushButton("CLEAR SWEEPS"); clear_btn.clicked.connect(lambda: self.send_control_command("CLEAR_SWEEPS"))
+        qa_lay.addWidget(clear_btn, 2, 0)
+        self.ack_lbl = QLabel("Ack: -- ms")
+        qa_lay.addWidget(self.ack_lbl, 2, 1)
         qa_box.setLayout(qa_lay); col1_lay.addWidget(qa_box)
         
         col1_lay.addWidget(QLabel("<b>ACTIVITY LOG</b>"))
@@ -194,21 +326,161 @@ class OscilloscopeGUI(QMainWindow):
         mon_head.addWidget(self.live_btn)
         self.auto_save_cb = QCheckBox("AUTO-SAVE LIVE")
         mon_head.addWidget(self.auto_save_cb)
+        self.live_preview_cb = QCheckBox("LIVE WAVEFORMS")
+        mon_head.addWidget(self.live_preview_cb)
         col2_lay.addLayout(mon_head)
 
-        self.screen_label = QLabel("DISCONNECTED"); self.screen_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.screen_label.setStyleSheet("background-color: #000; border: 2px solid #30363d; border-radius: 12px; color: #484f58; min-height: 600px;")
-        col2_lay.addWidget(self.screen_label, 1)
+        q_head = QHBoxLayout()
+        q_head.addWidget(QLabel("Live Quality:"))
+        self.quality_cb = QComboBox(); self.quality_cb.addItems(["LATENCY FIRST", "QUALITY FIRST"])
+        self.quality_cb.currentIndexChanged.connect(self.update_monitor_policy)
+        q_head.addWidget(self.quality_cb)
+        self.compact_cb = QCheckBox("COMPACT HARDCOPY (GRID ONLY)")
+        self.compact_cb.toggled.connect(self.request_compact_hardcopy.emit)
+        q_head.addWidget(self.compact_cb)
+        q_head.addStretch()
+        self.frame_time_lbl = QLabel("Frame: -- ms")
+        q_head.addWidget(self.frame_time_lbl)
+        col2_lay.addLayout(q_head)
+
+        self.monitor = MonitorWidget("DISCONNECTED")
+        self.monitor.setToolTip("Wheel: zoom  |  Drag: pan  |  Double-click: fit")
+        col2_lay.addWidget(self.monitor, 1)
+
+        self.analysis_tabs = QTabWidget(); self.analysis_tabs.setFixedHeight(230)
+        wf_tab = QWidget(); wf_lay = QVBoxLayout(wf_tab); wf_lay.setContentsMargins(4, 4, 4, 4)
+        wf_head = QHBoxLayout()
+        wf_head.addWidget(QLabel("Decimated preview of the visible window (wheel: zoom, double-click: full record)"))
+        wf_head.addStretch()
+        self.host_analysis_lbl = QLabel("")
+        wf_head.addWidget(self.host_analysis_lbl)
+        self.host_analysis_cb = QCheckBox("HOST ANALYSIS")
+        self.host_analysis_cb.setToolTip("Measure every downloaded waveform on a process pool (all CPU cores)")
+        self.host_analysis_cb.toggled.connect(self.toggle_host_analysis)
+        wf_head.addWidget(self.host_analysis_cb)
+        self.preview_btn = QPushButton("FETCH PREVIEW")
+        self.preview_btn.clicked.connect(self.fetch_waveform_preview)
+        wf_head.addWidget(self.preview_btn)
+        wf_lay.addLayout(wf_head)
+        self.waveform_plot = WaveformPlot(zoomable=True)
+        self.waveform_plot.window_changed.connect(self.on_waveform_window_changed)
+        wf_lay.addWidget(self.waveform_plot, 1)
+        self.analysis_tabs.addTab(wf_tab, "WAVEFORM")
+
+        trend_tab = QWidget(); trend_lay = QVBoxLayout(trend_tab); trend_lay.setContentsMargins(4, 4, 4, 4)
+        trend_head = QHBoxLayout()
+        trend_head.addWidget(QLabel("Stats Window:"))
+        self.stats_window_cb = QComboBox()
+        for n in [10, 100, 1000, 10000]: self.stats_window_cb.addItem(str(n), n)
+        self.stats_window_cb.setCurrentIndex(1)
+        self.stats_window_cb.currentIndexChanged.connect(self.on_stats_window_changed)
+        trend_head.addWidget(self.stats_window_cb)
+        self.trend_drift_lbl = QLabel("Drift: --")
+        trend_head.addWidget(self.trend_drift_lbl)
+        trend_head.addStretch()
+        export_hist_btn = QPushButton("EXPORT HISTORY"); export_hist_btn.clicked.connect(self.export_measure_history)
+        trend_head.addWidget(export_hist_btn)
+        clear_hist_btn = QPushButton("CLEAR"); clear_hist_btn.clicked.connect(self.clear_measure_history)
+        trend_head.addWidget(clear_hist_btn)
+        trend_lay.addLayout(trend_head)
+        self.trend_plot = WaveformPlot(x_label="Time (s)", y_label="Value")
+        trend_lay.addWidget(self.trend_plot, 1)
+        self.analysis_tabs.addTab(trend_tab, "TREND")
+
+        logger_tab = QWidget(); logger_lay = QGridLayout(logger_tab)
+        logger_lay.addWidget(QLabel("Poll Rate (Hz):"), 0, 0)
+        self.logger_rate_sb = QDoubleSpinBox(); self.logger_rate_sb.setRange(0.1, 50.0); self.logger_rate_sb.setValue(10.0)
+        logger_lay.addWidget(self.logger_rate_sb, 0, 1)
+        self.logger_btn = QPushButton("START LOGGING"); self.logger_btn.clicked.connect(self.toggle_logger)
+        logger_lay.addWidget(self.logger_btn, 0, 2)
+        self.logger_status_lbl = QLabel("Logger idle. Logs the configured measurement slots to an appendable binary file.")
+        logger_lay.addWidget(self.logger_status_lbl, 1, 0, 1, 3)
+        logger_lay.setRowStretch(2, 1)
+        self.analysis_tabs.addTab(logger_tab, "LOGGER")
+
+        fft_tab = QWidget(); fft_lay = QVBoxLayout(fft_tab); fft_lay.setContentsMargins(4, 4, 4, 4)
+        fft_head = QHBoxLayout()
+        self.fft_window_cb = QComboBox(); self.fft_window_cb.addItems(WINDOWS)
+        self.fft_scale_cb = QComboBox(); self.fft_scale_cb.addItems(SCALES)
+        self.fft_avg_cb = QComboBox(); self.fft_avg_cb.addItems(AVERAGING)
+        self.fft_points_cb = QComboBox()
+        for n in [1024, 4096, 16384, 65536, 262144, 1048576]: self.fft_points_cb.addItem(f"{n}", n)
+        self.fft_points_cb.setCurrentIndex(2)
+        for lbl, cb in [("Window:", self.fft_window_cb), ("Scale:", self.fft_scale_cb), ("Avg:", self.fft_avg_cb), ("Points:", self.fft_points_cb)]:
+            fft_head.addWidget(QLabel(lbl)); fft_head.addWidget(cb)
+            cb.currentIndexChanged.connect(self.on_spectrum_config_changed)
+        fft_head.addStretch()
+        self.fft_count_lbl = QLabel("")
+        fft_head.addWidget(self.fft_count_lbl)
+        self.fft_live_cb = QCheckBox("LIVE")
+        fft_head.addWidget(self.fft_live_cb)
+        fft_btn = QPushButton("ACQUIRE"); fft_btn.clicked.connect(self.fetch_spectrum)
+        fft_head.addWidget(fft_btn)
+        fft_lay.addLayout(fft_head)
+        self.spectrum_plot = WaveformPlot(x_label="Frequency (Hz)", y_label="dBV")
+        fft_lay.addWidget(self.spectrum_plot, 1)
+        self.analysis_tabs.addTab(fft_tab, "SPECTRUM")
+
+        pers_tab = QWidget(); pers_lay = QVBoxLayout(pers_tab); pers_lay.setContentsMargins(4, 4, 4, 4)
+        pers_head = QHBoxLayout()
+        self.pers_mode_cb = QComboBox(); self.pers_mode_cb.addItems(["PERSISTENCE", "EYE"])
+        self.pers_src_cb = QComboBox(); self.pers_src_cb.addItems(["C1", "C2", "C3", "C4"] + MATH_CHANNELS)
+        self.pers_decay_cb = QComboBox()
+        for lbl, d in [("Infinite", 0.0), ("0.5 %/acq", 0.005), ("2 %/acq", 0.02), ("10 %/acq", 0.1)]: self.pers_decay_cb.addItem(lbl, d)
+        self.pers_points_cb = QComboBox()
+        for n in [10000, 100000, 1000000]: self.pers_points_cb.addItem(f"{n}", n)
+        self.pers_ui_sb = QDoubleSpinBox(); self.pers_ui_sb.setRange(0.0, 1e6); self.pers_ui_sb.setDecimals(3); self.pers_ui_sb.setSuffix(" ns UI")
+        self.pers_ui_sb.setToolTip("Unit interval for eye folding (0 = recover the clock from the data)")
+        for lbl, w in [("Mode:", self.pers_mode_cb), ("Src:", self.pers_src_cb), ("Decay:", self.pers_decay_cb), ("Points:", self.pers_points_cb), ("", self.pers_ui_sb)]:
+            if lbl: pers_head.addWidget(QLabel(lbl))
+            pers_head.addWidget(w)
+        for w in [self.pers_mode_cb, self.pers_src_cb, self.pers_decay_cb, self.pers_points_cb]:
+            w.currentIndexChanged.connect(self.reset_persistence)
+        self.pers_ui_sb.valueChanged.connect(self.reset_persistence)
+        pers_head.addStretch()
+        self.pers_info_lbl = QLabel("")
+        pers_head.addWidget(self.pers_info_lbl)
+        self.pers_live_cb = QCheckBox("LIVE")
+        pers_head.addWidget(self.pers_live_cb)
+        pers_btn = QPushButton("ACQUIRE"); pers_btn.clicked.connect(self.fetch_persistence)
+        pers_head.addWidget(pers_btn)
+        pers_lay.addLayout(pers_head)
+        self.pers_view = QLabel(); self.pers_view.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.pers_view.setStyleSheet("background-color: #000;")
+        self.pers_view.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
+        pers_lay.addWidget(self.pers_view, 1)
+        self.analysis_tabs.addTab(pers_tab, "PERSISTENCE")
+
+        math_tab = QWidget(); math_lay = QGridLayout(math_tab); math_lay.setContentsMargins(4, 4, 4, 4)
+        self.math_rows = {}
+        for row, name in enumerate(MATH_CHANNELS):
+            math_lay.addWidget(QLabel(f"{name} ="), row, 0)
+            expr_in = QLineEdit(); expr_in.setPlaceholderText("e.g. C1 - C2,  C1 * C2 / 50,  abs(C3)")
+            expr_in.editingFinished.connect(lambda n=name: self.on_math_expression_changed(n))
+            math_lay.addWidget(expr_in, row, 1)
+            on_cb = QCheckBox("ON")
+            on_cb.toggled.connect(lambda checked, n=name: self.on_math_toggled(n, checked))
+            math_lay.addWidget(on_cb, row, 2)
+            info_lbl = QLabel("")
+            math_lay.addWidget(info_lbl, row, 3)
+            self.math_rows[name] = (expr_in, on_cb, info_lbl)
+        math_lay.setColumnStretch(1, 1); math_lay.setColumnStretch(3, 1)
+        save_math_btn = QPushButton("SAVE MATH"); save_math_btn.clicked.connect(self.save_math_waveforms)
+        math_lay.addWidget(save_math_btn, len(MATH_CHANNELS), 2, 1, 2)
+        math_lay.setRowStretch(len(MATH_CHANNELS) + 1, 1)
+        self.analysis_tabs.addTab(math_tab, "MATH")
+        col2_lay.addWidget(self.analysis_tabs)
         
         m_box = QGroupBox("ON-SCREEN MEASUREMENTS")
         m_lay = QHBoxLayout()
-        self.m_src = QComboBox(); self.m_src.addItems(["C1", "C2", "C3", "C4"])
+        self.m_src = QComboBox(); self.m_src.addItems(["C1", "C2", "C3", "C4"] + MATH_CHANNELS)
+        self.m_src.setToolTip("M1-M4 are measured on the host, on the latest downloaded math result")
         self.m_type = QComboBox(); self.m_type.addItems(["PKPK", "MAX", "MIN", "FREQ", "PERIOD"])
         m_lay.addWidget(QLabel("Source:"))
         m_lay.addWidget(self.m_src)
         m_lay.addWidget(QLabel("Type:"))
         m_lay.addWidget(self.m_type)
-        self.m_table = QTableWidget(1, 4); self.m_table.setHorizontalHeaderLabels(["Param", "Type", "Source", "Value"])
+        self.m_table = QTableWidget(1, 9); self.m_table.setHorizontalHeaderLabels(["Param", "Type", "Source", "Value", "Min", "Max", "Mean", "Std Dev", "N"])
         self.m_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch); self.m_table.setFixedHeight(90)
         m_lay.addWidget(self.m_table, 1)
         m_box.setLayout(m_lay); col2_lay.addWidget(m_box)
@@ -224,6 +496,9 @@ class OscilloscopeGUI(QMainWindow):
             ctrl = ChannelControl(ch); ctrl.settingChanged.connect(self.on_ui_change)
             ctrl.export_btn.clicked.connect(lambda checked, c=ch: self.save_waveform(c))
             col3_lay.addWidget(ctrl); self.channels[f"C{ch}"] = ctrl
+        self.export_all_btn = QPushButton("SAVE ALL ENABLED")
+        self.export_all_btn.clicked.connect(self.save_all_waveforms)
+        col3_lay.addWidget(self.export_all_btn)
         col3_lay.addStretch()
 
     def log(self, msg, error=False):
@@ -254,16 +529,33 @@ class OscilloscopeGUI(QMainWindow):
     def toggle_connection(self):
         if self.worker._is_connected: 
             self.log("Disconnecting from instrument...")
+            self.close_control_session()
             self.request_cleanup.emit()
+            self.record_action.blockSignals(True)
+            self.record_action.setChecked(False)
+            self.record_action.blockSignals(False)
             self.connect_btn.setText("CONNECT")
             self.pulse_heartbeat(False)
+            self.monitor.clear("DISCONNECTED")
         else:
-            self.request_connect.emit(self.ip_input.text())
+            self.monitor.set_message("CONNECTING...")
+            self.request_connect.emit(self.ip_input.text(), self.handshake_timeout(self.ip_input.text().strip()))
+
+    def close_control_session(self):
+        # Blocking: the control session must be closed before the main worker's cleanup
+        # closes the shared ResourceManager
+        if self.control_thread.isRunning():
+            QMetaObject.invokeMethod(self.control_worker, "cleanup", Qt.ConnectionType.BlockingQueuedConnection)
 
     def on_connected(self, idn): 
         self.log(f"CONNECTED: {idn}")
         self.connect_btn.setText("DISCONNECT")
         self.pulse_heartbeat(True)
+        self.monitor.set_message("NO SCREENSHOT YET - START LIVE OR CAPTURE")
+        self._scope_state = {}
+        self._pending_recalls = {}
+        if parse_replay_address(self.ip_input.text()) is None:
+            self.request_control_connect.emit(self.ip_input.text())
         self.log("Ready. Use SYNC/APPLY buttons to manage settings.")
 
     def poll_settings(self):
@@ -274,8 +566,15 @@ class OscilloscopeGUI(QMainWindow):
 
     def on_error(self, err): 
         self.log(f"CRITICAL ERROR: {err}", True)
+        if not self.worker._is_connected:
+            # A stale frame would look like a live instrument
+            if self.connect_btn.text() == "DISCONNECT": self.monitor.clear("CONNECTION LOST")
+            else: self.monitor.set_message("NOT CONNECTED")
         if self._live_active:
             self.toggle_live()
+        self._log_pending = False
+        if self.measure_logger is not None and not self.worker._is_connected:
+            self.toggle_logger()
         self.update_status_bar(f"Error: {err}")
 
     def toggle_live(self):
@@ -283,9 +582,28 @@ class OscilloscopeGUI(QMainWindow):
         self._live_active = not self._live_active
         self.live_btn.setText("STOP LIVE" if self._live_active else "START LIVE")
         if self._live_active:
+            self._frame_time_avg = None
             self.live_timer.start(100)
         else:
             self.live_timer.stop()
+        self.update_monitor_policy()
+
+    def toggle_stream_server(self, enabled):
+        if enabled:
+            if self.publisher.start(DEFAULT_STREAM_PORT, allow_lan=self.stream_lan_action.isChecked()):
+                self.log(f"Stream server listening on {self.publisher.address()}"
+                         + (" (reachable from the LAN, no authentication)." if self.stream_lan_action.isChecked() else " (this computer only)."))
+            else:
+                self.stream_action.blockSignals(True); self.stream_action.setChecked(False); self.stream_action.blockSignals(False)
+        elif self.publisher.is_running():
+            self.publisher.stop()
+            self.log(f"Stream server stopped ({self.publisher.dropped_frames} frames dropped for slow subscribers).")
+
+    def on_stream_lan_toggled(self, allow_lan):
+        # Rebind a running server so the new scope takes effect right away
+        if self.publisher.is_running():
+            self.toggle_stream_server(False)
+            self.toggle_stream_server(True)
 
     def update_status_bar(self, msg):
         self.status_bar.showMessage(msg, 3000)
@@ -295,9 +613,21 @@ class OscilloscopeGUI(QMainWindow):
         
         self.live_timer.stop()
         self._live_active = False
+        if self.measure_logger is not None:
+            self.toggle_logger()
         
+        self.close_control_session()
         self.request_cleanup.emit()
+        if self.publisher.is_running():
+            self.publisher.stop()
+        if self.pipeline is not None:
+            self.pipeline.shutdown()
         
+        self.discovery_worker.cancel()
+        self.discovery_thread.quit()
+        self.discovery_thread.wait(2000)
+        self.control_thread.quit()
+        self.control_thread.wait(2000)
         self.worker_thread.quit()
         self.worker_thread.wait(2000) 
         
@@ -306,53 +636,341 @@ class OscilloscopeGUI(QMainWindow):
     def single_capture(self):
         if not self.worker._is_connected: return
         self.log("Capturing screen...")
-        
-        lbl_w = self.screen_label.width()
-        lbl_h = self.screen_label.height()
-        target_size = (max(640, lbl_w - 20), max(480, lbl_h - 20))
-        
-        self.request_screenshot.emit(target_size)
+        self._frame_request_t = time.perf_counter()
+        self.request_screenshot.emit()
+
+    def is_latency_first(self):
+        return self.quality_cb.currentText() == "LATENCY FIRST"
+
+    def update_monitor_policy(self):
+        # Fast scaling only while streaming latency-first; a stopped stream is redrawn smoothly
+        self.monitor.set_fast(self._live_active and self.is_latency_first())
 
     def on_live_tick(self):
         if not self.worker._is_connected or not self._live_active:
             return
 
-        m_src = self.m_src.currentText()
-        m_type = self.m_type.currentText()
-        
-        lbl_w = self.screen_label.width()
-        lbl_h = self.screen_label.height()
-        target_size = (max(640, lbl_w - 20), max(480, lbl_h - 20))
+        self._frame_request_t = time.perf_counter()
+        self.request_screenshot.emit()
 
-        self.request_screenshot.emit(target_size)
+        # A math measurement source needs its sources downloaded even without the live preview
+        if self.live_preview_cb.isChecked() or self.measure_math():
+            self.fetch_waveform_preview()
+        if self.fft_live_cb.isChecked():
+            self.fetch_spectrum()
+        if self.pers_live_cb.isChecked():
+            self.fetch_persistence()
         
-        config = [{'p_index': 1, 'source': m_src, 'type': m_type}]
-        self.request_measurements.emit(config)
+        if not self.measure_math():
+            self.request_measurements.emit(self.measure_config())
         
         self.sync_counter += 1
         if self.sync_counter >= 5:
             self.sync_counter = 0
-            self.request_sync.emit()
+            self.request_change_check.emit()
+
+    def measure_config(self):
+        return [{'p_index': 1, 'source': self.m_src.currentText(), 'type': self.m_type.currentText()}]
+
+    def measure_math(self):
+        """Math channel selected as measurement source (measured on the host), or None."""
+        src = self.m_src.currentText()
+        return src if src in MATH_CHANNELS and src in self.math.programs else None
+
+    def update_host_measure(self, wf):
+        # Same result format as the instrument's fetch_measurements
+        if len(wf) < 2: return
+        m = measure_waveform(wf.volts, wf.dt)
+        m_type = self.m_type.currentText()
+        value = {'PKPK': m['pkpk'], 'MAX': m['max'], 'MIN': m['min'], 'FREQ': m['freq'],
+                 'PERIOD': 1.0 / m['freq'] if m['freq'] > 0 else float('nan')}[m_type]
+        results = [{'p': "P1", 'source': wf.channel, 'type': m_type, 'value': f"{value:.6E}"}]
+        self.update_measures_table(results)
+        self.publisher.publish_measurements(results)
+
+    def toggle_logger(self):
+        if self.measure_logger is not None:
+            self.logger_timer.stop()
+            try: self.measure_logger.close()
+            except Exception as e: self.log(f"Logger Close Error: {e}", True)
+            self.log(f"Logging stopped: {self.measure_logger.rows_written} rows in {os.path.basename(self.measure_logger.path)}")
+            self.measure_logger = None
+            self.logger_btn.setText("START LOGGING")
+            self.set_measure_config_locked(False)
+            return
+
+        if not self.worker._is_connected: return
+        if self.m_src.currentText() in MATH_CHANNELS:
+            self.log("The measurement logger reads instrument measurement slots: select C1-C4 as source.", True)
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Measurement Log (appends if it exists)", "measurements.mlog", "Measurement Log (*.mlog)",
+                                              options=QFileDialog.Option.DontConfirmOverwrite)
+        if not path: return
+        config = self.measure_config()
+        columns = [f"P{p['p_index']}_{p['source']}_{p['type']}" for p in config]
+        try:
+            self.measure_logger = MeasurementLogger(path, columns)
+        except Exception as e:
+            self.log(f"Logger Open Error: {e}", True)
+            return
+        self._log_slots = [p['p_index'] for p in config]
+        self._log_pending = False
+        self.request_measurements.emit(config)
+        self.logger_timer.start(int(1000.0 / self.logger_rate_sb.value()))
+        self.logger_btn.setText("STOP LOGGING")
+        self.set_measure_config_locked(True)
+        self.log(f"Logging {', '.join(columns)} to {os.path.basename(path)} ({self.measure_logger.rows_written} existing rows)")
+
+    def set_measure_config_locked(self, locked):
+        # The log columns are named after P1's source/type: keep them fixed while logging
+        for cb in [self.m_src, self.m_type]: cb.setEnabled(not locked)
+
+    def on_logger_tick(self):
+        # Skip the tick instead of queueing requests behind a slow instrument
+        if self._log_pending or not self.worker._is_connected: return
+        self._log_pending = True
+        self.request_measure_values.emit(self._log_slots)
+
+    def on_measure_values(self, t, values):
+        self._log_pending = False
+        if self.measure_logger is None: return
+        try:
+            self.measure_logger.add(t, values)
+        except Exception as e:
+            self.log(f"Logger Write Error: {e}", True)
+            self.toggle_logger()
+            return
+        self.logger_status_lbl.setText(f"{self.measure_logger.rows_logged} rows -> {self.measure_logger.path}")
 
     def on_refresh_done(self):
         if self._live_active:
             self.live_timer.start(200)
 
+    def on_screenshot_data(self, png_data):
+        # Original PNG from the instrument: saved as-is, no per-frame re-encode
+        self._last_image_data = png_data
+
     def display_screenshot(self, img):
         if img.isNull(): return
-        
-        from PyQt6.QtCore import QBuffer, QIODevice
-        ba = QBuffer()
-        ba.open(QIODevice.OpenModeFlag.WriteOnly)
-        img.save(ba, "PNG")
-        self._last_image_data = ba.data().data()
-
-        pix = QPixmap.fromImage(img)
-        self.screen_label.setPixmap(pix)
-        
+
+        if self._frame_request_t is not None:
+            frame_ms = (time.perf_counter() - self._frame_request_t) * 1000.0
+            self._frame_request_t = None
+            self._frame_time_avg = frame_ms if self._frame_time_avg is None else 0.8 * self._frame_time_avg + 0.2 * frame_ms
+            self.frame_time_lbl.setText(f"Frame: {frame_ms:.0f} ms (avg {self._frame_time_avg:.0f} ms)")
+
+        self.monitor.set_frame(img)
+
         if self.auto_save_cb.isChecked():
             self.save_screenshot_to_file(is_auto=True)
 
+    def enabled_channels(self):
+        return [ch_id for ch_id, ctrl in self.channels.items() if ctrl.trace_cb.currentText() == "ON"]
+
+    def enabled_math(self):
+        return [name for name, (_, on_cb, _) in self.math_rows.items() if on_cb.isChecked() and name in self.math.programs]
+
+    def channels_to_fetch(self, enabled, math_names):
+        """Physical channels to download: the enabled ones plus the sources of the math channels."""
+        return enabled + [src for src in self.math.sources(math_names) if src not in enabled]
+
+    def fetch_waveform_preview(self):
+        if not self.worker._is_connected: return
+        enabled = self.enabled_channels()
+        math_names = self.enabled_math()
+        for name in list(self.channels) + MATH_CHANNELS:
+            if name not in enabled and name not in math_names: self.waveform_plot.remove_trace(name)
+        if self.measure_math() and self.measure_math() not in math_names:
+            math_names = math_names + [self.measure_math()]
+        fetch = self.channels_to_fetch(enabled, math_names)
+        if fetch:
+            # Math sources must come from one acquisition: the worker holds the trigger for them
+            self.request_waveform_preview.emit(fetch, max(100, self.waveform_plot.width()), *self.waveform_plot.window,
+                                               bool(self.math.sources(math_names)))
+
+    def on_waveform_window_changed(self, start, end):
+        # The live loop picks the new window up on its next tick
+        if not self._live_active or not self.live_preview_cb.isChecked():
+            self.fetch_waveform_preview()
+
+    def on_waveform_ready(self, wf):
+        try:
+            derived = self.math.add(wf)
+        except Exception as e:
+            self.log(f"Math Error: {e}", True)
+            derived = []
+        self.route_waveform(wf)
+        math_names = self.enabled_math()
+        for m in derived:
+            if m.channel in math_names or (m.tag == "persistence" and m.channel == self.pers_src_cb.currentText()):
+                self.route_waveform(m)
+            if m.channel in math_names:
+                self.publisher.publish_waveform(m)
+            if m.channel == self.measure_math() and m.tag == "preview":
+                self.update_host_measure(m)
+
+    def route_waveform(self, wf):
+        # Channels downloaded only as math sources are not displayed themselves
+        if wf.channel in self.channels and wf.tag != "persistence" and self.channels[wf.channel].trace_cb.currentText() != "ON":
+            return
+        if wf.channel in self.math_rows:
+            self.update_math_info(wf)
+        pooled = self.pipeline is not None and self.host_analysis_cb.isChecked()
+        if wf.tag == "spectrum":
+            # With the pool running, the FFT is done there and plotted from on_analysis_result.
+            # A buffer the pool drops (too many pending jobs) is transformed here instead.
+            if len(wf) >= 16 and not (pooled and self.pipeline.submit(wf, ('measure', 'fft'), self.spectrum.window)):
+                self.update_spectrum(wf)
+            return
+        if pooled:
+            self.pipeline.submit(wf, ('measure',))
+        if wf.tag == "persistence":
+            self.update_persistence(wf)
+        else:
+            self.waveform_plot.set_trace(wf.channel, wf.times, wf.volts)
+
+    def on_math_expression_changed(self, name):
+        expr_in, on_cb, info_lbl = self.math_rows[name]
+        try:
+            self.math.set_expression(name, expr_in.text())
+        except ValueError as e:
+            self.math.set_expression(name, "")
+            expr_in.setStyleSheet("border: 1px solid #f85149;")
+            info_lbl.setText(str(e))
+            return
+        expr_in.setStyleSheet("")
+        info_lbl.setText("")
+        for plot in [self.waveform_plot, self.spectrum_plot]: plot.remove_trace(name)
+        self.spectrum.reset()
+
+    def on_math_toggled(self, name, checked):
+        if not checked:
+            self.waveform_plot.remove_trace(name)
+            self.spectrum_plot.remove_trace(name)
+            self.math_rows[name][2].setText("")
+
+    def update_math_info(self, wf):
+        """Host measurements of a math channel, on the cached result of this acquisition."""
+        if len(wf) < 2: return
+        m = measure_waveform(wf.volts, wf.dt)
+        self.math_rows[wf.channel][2].setText(f"pk-pk {m['pkpk']:.4g}  mean {m['mean']:.4g}  rms {m['rms']:.4g}  ({len(wf)} pts, {wf.tag})")
+
+    def save_math_waveforms(self):
+        results = [self.math.latest(name) for name in self.enabled_math()]
+        results = [wf for wf in results if wf is not None]
+        if not results:
+            self.log("No math results to save (enable a math channel and acquire first)!", True)
+            return
+        start_dir = self.waveform_dir if os.path.isdir(self.waveform_dir) else os.path.expanduser("~")
+        base_dir = QFileDialog.getExistingDirectory(self, "Select Math Export Folder", start_dir)
+        if not base_dir: return
+        bundle_dir = os.path.join(base_dir, f"math_{time.strftime('%Y%m%d_%H%M%S')}")
+        try:
+            write_math_bundle(bundle_dir, results, {wf.channel: self.math.programs[wf.channel].expression for wf in results})
+            self.log(f"Math channels {', '.join(wf.channel for wf in results)} saved to {os.path.basename(bundle_dir)}")
+        except Exception as e:
+            self.log(f"Math Save Error: {e}", True)
+
+    def toggle_host_analysis(self, enabled):
+        if enabled and self.pipeline is None:
+            try:
+                self.pipeline = AnalysisPipeline(parent=self)
+            except Exception as e:
+                self.log(f"Analysis Pipeline Error: {e}", True)
+                self.host_analysis_cb.setChecked(False)
+                return
+            self.pipeline.result_ready.connect(self.on_analysis_result)
+            self.pipeline.error.connect(lambda m: self.log(m, True))
+            self.log(f"Host analysis pipeline started ({self.pipeline.workers} processes).")
+        if not enabled:
+            self.host_analysis_lbl.setText("")
+
+    def on_analysis_result(self, res):
+        if 'fft' in res:
+            self.apply_pooled_spectrum(res)
+        if not self.host_analysis_cb.isChecked() or 'measure' not in res: return
+        m = res['measure']
+        self.host_analysis_lbl.setText(f"{res['channel']}: pk-pk {m['pkpk']:.4g} V, rms {m['rms']:.4g} V, "
+                                       f"freq {m['freq']:.4g} Hz ({res['elapsed_ms']:.1f} ms)")
+
+    def fetch_spectrum(self):
+        if not self.worker._is_connected: return
+        enabled = self.enabled_channels()
+        math_names = self.enabled_math()
+        for name in list(self.channels) + MATH_CHANNELS:
+            if name not in enabled and name not in math_names: self.spectrum_plot.remove_trace(name)
+        fetch = self.channels_to_fetch(enabled, math_names)
+        if fetch:
+            # Full sample rate window: the spectrum must not be computed on sparsed data
+            self.request_waveform_window.emit(fetch, 0, self.fft_points_cb.currentData(), 1, "spectrum",
+                                              bool(self.math.sources(math_names)))
+
+    def fetch_persistence(self):
+        if not self.worker._is_connected: return
+        src = self.pers_src_cb.currentText()
+        fetch = self.math.sources([src]) if src in MATH_CHANNELS else [src]
+        if fetch:
+            self.request_waveform_window.emit(fetch, 0, self.pers_points_cb.currentData(), 1, "persistence", src in MATH_CHANNELS)
+
+    def reset_persistence(self):
+        self.persistence.eye_mode = self.pers_mode_cb.currentText() == "EYE"
+        self.persistence.decay = self.pers_decay_cb.currentData()
+        self.persistence.ui = self.pers_ui_sb.value() * 1e-9 or None
+        self.persistence.reset()
+        self.pers_view.clear()
+        self.pers_info_lbl.setText("")
+
+    def update_persistence(self, wf):
+        if wf.channel != self.pers_src_cb.currentText() or len(wf) < 2: return
+        try:
+            if not self.persistence.accumulate(wf.times, wf.volts):
+                self.pers_info_lbl.setText("No clock recovered (too few transitions)")
+                return
+        except Exception as e:
+            self.log(f"Persistence Error: {e}", True)
+            return
+        info = f"{self.persistence.count} acq"
+        if self.persistence.eye_mode and self.persistence.last_clock:
+            info += f", UI {self.persistence.last_clock[0] * 1e9:.4g} ns"
+        self.pers_info_lbl.setText(info)
+        pix = QPixmap.fromImage(self.persistence.render())
+        self.pers_view.setPixmap(pix.scaled(self.pers_view.size(), Qt.AspectRatioMode.IgnoreAspectRatio,
+                                            Qt.TransformationMode.FastTransformation))
+
+    def on_spectrum_config_changed(self):
+        self.spectrum.window = self.fft_window_cb.currentText()
+        self.spectrum.averaging = self.fft_avg_cb.currentText()
+        self.spectrum.reset()
+        self.spectrum_plot.y_label = self.fft_scale_cb.currentText()
+        self.spectrum_plot.clear()
+        self.fft_count_lbl.setText("")
+
+    def update_spectrum(self, wf):
+        if len(wf) < 16: return
+        try:
+            freqs, v_rms, count = self.spectrum.update(wf.channel, wf.volts, wf.dt)
+            self.plot_spectrum(wf.channel, len(wf), freqs, v_rms, count)
+        except Exception as e:
+            self.log(f"Spectrum Error: {e}", True)
+
+    def apply_pooled_spectrum(self, res):
+        """Averages and plots a spectrum computed on the analysis pool (only the averaging runs here)."""
+        fft = res['fft']
+        # Results that arrive after the window changed or the trace was switched off are dropped
+        if fft['window'] != self.spectrum.window: return
+        if res['channel'] not in self.enabled_channels() + self.enabled_math(): return
+        try:
+            freqs = get_freqs(res['points'], float(res['dt']))
+            freqs, v_rms, count = self.spectrum.add(res['channel'], freqs, fft['mag'], res['dt'])
+            self.plot_spectrum(res['channel'], res['points'], freqs, v_rms, count)
+        except Exception as e:
+            self.log(f"Spectrum Error: {e}", True)
+
+    def plot_spectrum(self, channel, points, freqs, v_rms, count):
+        f, y = decimate_peaks(freqs, to_scale(v_rms, self.fft_scale_cb.currentText()), max(100, self.spectrum_plot.width()))
+        self.spectrum_plot.set_trace(channel, f, y)
+        self.fft_count_lbl.setText(f"{points} pts, {count} acq")
+
     def update_measures_table(self, data):
         for i, m in enumerate(data):
             self.m_table.setItem(i, 0, QTableWidgetItem(m['p']))
@@ -360,6 +978,45 @@ class OscilloscopeGUI(QMainWindow):
             self.m_table.setItem(i, 2, QTableWidgetItem(m['source']))
             self.m_table.setItem(i, 3, QTableWidgetItem(m['value']))
 
+            try: value = float(m['value'])
+            except ValueError: continue
+            if not math.isfinite(value): continue
+            label = f"{m['p']}_{m['source']}_{m['type']}"
+            hist = self.measure_history.get(label)
+            if hist is None:
+                hist = MeasurementHistory(window=self.stats_window_cb.currentData())
+                self.measure_history[label] = hist
+            hist.add(time.time(), value)
+            st = hist.stats()
+            for col, key in enumerate(["min", "max", "mean", "std"], start=4):
+                self.m_table.setItem(i, col, QTableWidgetItem(f"{st[key]:.6g}"))
+            self.m_table.setItem(i, 8, QTableWidgetItem(str(st['n'])))
+            self.trend_drift_lbl.setText(f"Drift: {st['drift_per_hour']:.4g} /h over {st['total']} samples")
+            t, v = hist.downsample(max(100, self.trend_plot.width()))
+            self.trend_plot.set_trace(label, t - t[0], v, TRACE_COLORS.get(m['source']))
+
+    def on_stats_window_changed(self):
+        for hist in self.measure_history.values():
+            hist.set_window(self.stats_window_cb.currentData())
+
+    def clear_measure_history(self):
+        self.measure_history = {}
+        self.trend_plot.clear()
+        self.trend_drift_lbl.setText("Drift: --")
+
+    def export_measure_history(self):
+        if not self.measure_history:
+            self.log("No measurement history to export!", True)
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export Measurement History", f"measurements_{time.strftime('%Y%m%d_%H%M%S')}.csv",
+                                              "CSV (*.csv);;NumPy (*.npz)")
+        if not path: return
+        try:
+            export_histories(path, self.measure_history)
+            self.log(f"Measurement history saved to {os.path.basename(path)}")
+        except Exception as e:
+            self.log(f"History Export Error: {e}", True)
+
     def on_ui_change(self):
         if self._is_gui_updating: return
         self.apply_to_btn.setObjectName("apply_btn_dirty")
@@ -370,34 +1027,24 @@ class OscilloscopeGUI(QMainWindow):
         self.hb_led.setObjectName("heartbeat_on" if active else "heartbeat_off")
         self.hb_led.style().unpolish(self.hb_led); self.hb_led.style().polish(self.hb_led)
 
-    def apply_synced_settings(self, s):
+    def on_settings_ready(self, s):
+        # Result of SYNC FROM SCOPE: the only path that ends a manual sync
+        try:
+            self.apply_synced_settings(s)
+        finally:
+            self._is_syncing = False
+
+    def on_settings_changed(self, s):
+        # Background sync: only touch widgets whose instrument value really differs from the cache
+        changed = {k: v for k, v in s.items() if self._scope_state.get(k) != v}
+        if not changed: return
+        self.log(f"Instrument settings changed: {', '.join(sorted(changed))}")
+        self.apply_synced_settings(changed, quiet=True)
+
+    def apply_synced_settings(self, s, quiet=False):
         self._is_gui_updating = True
         self.pulse_heartbeat(True)
         try:
-            def parse_num(val_str):
-                if not val_str: return 0.0
-                clean = "".join(c for c in val_str if c in "0123456789.eE+-")
-                try: return float(clean)
-                except: return 0.0
-
-            def set_combo_by_data(cb, val):
-                min_diff = float('inf'); best_idx = -1
-                for i in range(cb.count()):
-                    try:
-                        cbd = float(cb.itemData(i))
-                        if abs(cbd - val) < min_diff: min_diff = abs(cbd - val); best_idx = i
-                    except: pass
-                if best_idx >= 0 and cb.currentIndex() != best_idx:
-                    cb.blockSignals(True); cb.setCurrentIndex(best_idx); cb.blockSignals(False)
-            
-            def set_combo_by_text(cb, text):
-                if not text: return
-                best_idx = -1
-                for i in range(cb.count()):
-                    if cb.itemText(i).upper() == text.upper(): best_idx = i; break
-                if best_idx >= 0 and cb.currentIndex() != best_idx:
-                    cb.blockSignals(True); cb.setCurrentIndex(best_idx); cb.blockSignals(False)
-
             if 'TIME_DIV' in s:
                 try: set_combo_by_data(self.timebase_cb, parse_num(s['TIME_DIV']))
                 except Exception as e: self.log(f"Error syncing TIME_DIV: {e}", True)
@@ -422,7 +1069,7 @@ class OscilloscopeGUI(QMainWindow):
                     if f'{ch}:COUPLING' in s:
                         cpl = cpl_map.get(s[f'{ch}:COUPLING'].upper(), s[f'{ch}:COUPLING'].upper())
                         idx = ctrl.coupling_cb.findText(cpl)
-                        if idx >= 0:
+                        if idx >= 0 and idx != ctrl.coupling_cb.currentIndex():
                             ctrl.coupling_cb.blockSignals(True); ctrl.coupling_cb.setCurrentIndex(idx); ctrl.last_coupling_idx = idx; ctrl.coupling_cb.blockSignals(False)
                     if f'{ch}:BANDWIDTH_LIMIT' in s:
                         set_combo_by_text(ctrl.bw_cb, bw_map.get(s[f'{ch}:BANDWIDTH_LIMIT'].upper(), s[f'{ch}:BANDWIDTH_LIMIT']))
@@ -443,7 +1090,8 @@ class OscilloscopeGUI(QMainWindow):
                     if abs(self.trig_lvl.value() - nv) > 0.001:
                         self.trig_lvl.blockSignals(True); self.trig_lvl.setValue(nv); self.trig_lvl.blockSignals(False)
                 except Exception as e: self.log(f"Error syncing TRIG_LVL: {e}", True)
-            self.log("Sync completed.")
+            self._scope_state.update(s)
+            if not quiet: self.log("Sync completed.")
         except Exception as e:
             self.log(f"Sync UI Error: {e}", True)
             for ctrl in self.channels.values():
@@ -452,15 +1100,24 @@ class OscilloscopeGUI(QMainWindow):
                 ctrl.coupling_cb.blockSignals(False)
         finally:
             self._is_gui_updating = False
-            self._is_syncing = False
             self.pulse_heartbeat(self.worker._is_connected)
 
     def force_apply(self):
         if not self.worker._is_connected: return
         self.apply_to_btn.setEnabled(False)
         self.log("Applying GUI settings to instrument...")
+        self._scope_state = {}
         self.pulse_heartbeat(True)
         
+        self.request_multiple_commands.emit(self.build_apply_commands())
+        
+        QTimer.singleShot(500, lambda: self.apply_to_btn.setEnabled(True))
+        QTimer.singleShot(500, lambda: self.apply_to_btn.setObjectName("apply_btn_clean"))
+        QTimer.singleShot(500, lambda: self.apply_to_btn.style().unpolish(self.apply_to_btn))
+        QTimer.singleShot(500, lambda: self.apply_to_btn.style().polish(self.apply_to_btn))
+
+    def build_apply_commands(self):
+        """Every GUI setting as instrument commands (APPLY TO SCOPE)."""
         cmds = []
         cmds.append(f"TIME_DIV {self.timebase_cb.currentData()}")
         
@@ -481,19 +1138,25 @@ class OscilloscopeGUI(QMainWindow):
         cmds.append(f"TRIG_LVL {self.trig_lvl.value()}")
         cmds.append(f"TRIG_SELECT {self.trig_type.currentText()},{self.trig_src.currentText()}")
         cmds.append(f"{self.trig_src.currentText()}:TRIG_SLOPE {self.trig_slope.currentText()}")
-        
-        self.request_multiple_commands.emit(cmds)
-        
-        QTimer.singleShot(500, lambda: self.apply_to_btn.setEnabled(True))
-        QTimer.singleShot(500, lambda: self.apply_to_btn.setObjectName("apply_btn_clean"))
-        QTimer.singleShot(500, lambda: self.apply_to_btn.style().unpolish(self.apply_to_btn))
-        QTimer.singleShot(500, lambda: self.apply_to_btn.style().polish(self.apply_to_btn))
+        return cmds
 
     def set_trigger_mode(self, mode):
         idx = self.trig_mode.findText(mode)
         if idx >= 0: self.trig_mode.setCurrentIndex(idx)
         if self.worker._is_connected: 
-            self.request_command.emit(f"TRIG_MODE {mode}")
+            self.send_control_command(f"TRIG_MODE {mode}")
+            self._scope_state['TRIG_MODE'] = mode
+
+    def send_control_command(self, cmd):
+        if self.control_worker._is_connected:
+            self.request_control_command.emit(cmd)
+        elif self.worker._is_connected:
+            # No control session: fall back to the (possibly busy) main worker
+            self.request_command.emit(cmd)
+
+    def on_control_ack(self, cmd, latency_ms):
+        self.ack_lbl.setText(f"Ack: {latency_ms:.1f} ms")
+        self.update_status_bar(f"{cmd} acknowledged in {latency_ms:.1f} ms")
 
     def save_waveform(self, ch):
         if not self.worker._is_connected: return
@@ -501,6 +1164,31 @@ class OscilloscopeGUI(QMainWindow):
         if path: 
             self.request_waveform.emit(f"C{ch}", path)
 
+    def save_all_waveforms(self):
+        if not self.worker._is_connected: return
+        enabled = [ch_id for ch_id, ctrl in self.channels.items() if ctrl.trace_cb.currentText() == "ON"]
+        math_expressions = {name: self.math.programs[name].expression for name in self.enabled_math()}
+        if not enabled and not math_expressions:
+            self.log("No enabled channels to export!", True)
+            return
+        start_dir = self.waveform_dir if os.path.isdir(self.waveform_dir) else os.path.expanduser("~")
+        base_dir = QFileDialog.getExistingDirectory(self, "Select Waveform Export Folder", start_dir)
+        if not base_dir: return
+        bundle_dir = os.path.join(base_dir, f"waveforms_{time.strftime('%Y%m%d_%H%M%S')}")
+        self.log(f"Exporting {', '.join(enabled + list(math_expressions))} to {os.path.basename(bundle_dir)}...")
+        self.request_export_all.emit(enabled, bundle_dir, self.snapshot_gui_state(), math_expressions)
+
+    def snapshot_gui_state(self):
+        return {
+            "timebase": self.timebase_cb.currentData(),
+            "trig_mode": self.trig_mode.currentText(),
+            "trig_type": self.trig_type.currentText(),
+            "trig_src": self.trig_src.currentText(),
+            "trig_slope": self.trig_slope.currentText(),
+            "trig_lvl": self.trig_lvl.value(),
+            "channels": {ch_id: ctrl.get_settings() for ch_id, ctrl in self.channels.items()},
+        }
+
     def save_screenshot_to_file(self, is_auto=False):
         if hasattr(self, '_last_image_data'):
             if not os.path.exists(self.screenshot_dir):
@@ -525,5 +1213,113 @@ class OscilloscopeGUI(QMainWindow):
             if not is_auto:
                 self.log("No image to save!", True)
 
-    def export_setup(self): self.log("Export setup function called.")
-    def import_setup(self): self.log("Import setup function called.")
+    def toggle_session_recording(self, enabled):
+        if not enabled:
+            self.request_session_recording.emit("")
+            self.log("VISA session recording stopped.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Record VISA Session", f"session_{time.strftime('%Y%m%d_%H%M%S')}.visarec",
+                                              "VISA Session (*.visarec)")
+        if not path:
+            self.record_action.blockSignals(True)
+            self.record_action.setChecked(False)
+            self.record_action.blockSignals(False)
+            return
+        self.request_session_recording.emit(path)
+        self.log(f"Recording VISA session to {os.path.basename(path)}" + ("" if self.worker._is_connected else " (from next connection)"))
+
+    def find_instruments(self):
+        if self.worker._is_connected:
+            self.log("Disconnect before scanning for instruments!", True)
+            return
+        try:
+            targets = str(ipaddress.ip_network(f"{self.ip_input.text().strip()}/24", strict=False))
+        except ValueError:
+            targets = "192.168.1.0/24"
+        dialog = DiscoveryDialog(targets, self)
+        dialog.scan_requested.connect(self.request_discovery.emit)
+        # Direct call: the worker thread is busy inside the scan
+        dialog.cancel_requested.connect(lambda: self.discovery_worker.cancel())
+        links = [(self.discovery_worker.found, dialog.add_result), (self.discovery_worker.progress, dialog.set_progress),
+                 (self.discovery_worker.finished, dialog.on_finished), (self.discovery_worker.error, dialog.on_error)]
+        for signal, slot in links:
+            signal.connect(slot)
+        accepted = dialog.exec()
+        self.discovery_worker.cancel()
+        for signal, slot in links:
+            signal.disconnect(slot)
+        self._discovered.update(dialog.found)
+        host = dialog.selected_host()
+        if accepted and host:
+            self.ip_input.setText(host)
+            self.log(f"Selected instrument at {host}.")
+
+    def handshake_timeout(self, host):
+        """Open / *IDN? timeout in ms for a host that answered the LAN scan over VXI-11 (0: default 5 s)."""
+        result = self._discovered.get(host)
+        if result is None or not result['vxi11_port']:
+            return 0
+        return int(min(5000, max(1000, 10 * result['ms'])))
+
+    def replay_session(self):
+        if self.worker._is_connected:
+            self.log("Disconnect before replaying a session!", True)
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Replay VISA Session", "", "VISA Session (*.visarec)")
+        if not path: return
+        timings = {"ORIGINAL": 1.0, "HALF (x0.5)": 0.5, "DOUBLE (x2)": 2.0, "ZERO": 0.0}
+        timing, ok = QInputDialog.getItem(self, "Replay VISA Session", "Latency:", list(timings), 0, False)
+        if not ok: return
+        # The replay address goes through the normal connect path
+        self.ip_input.setText(f"replay@{timings[timing]:g}:{path}")
+        self.request_connect.emit(self.ip_input.text(), 0)
+
+    def export_setup(self):
+        if not self.worker._is_connected: return
+        name, ok = QInputDialog.getText(self, "Export Device Setup", "Setup name:", text=f"setup_{time.strftime('%Y%m%d_%H%M%S')}")
+        if ok and name.strip():
+            self.log(f"Capturing device setup '{name.strip()}'...")
+            self.request_capture_setup.emit(name.strip())
+
+    def on_setup_captured(self, name, settings, blob):
+        try:
+            self.setup_library.save(name, settings, self.snapshot_gui_state(), blob)
+            self._scope_state.update(settings)
+            self.log(f"Setup '{name}' saved to library ({len(blob)} bytes).")
+        except Exception as e:
+            self.log(f"Setup Save Error: {e}", True)
+
+    def import_setup(self):
+        if not self.worker._is_connected: return
+        names = self.setup_library.names()
+        if not names:
+            self.log("Setup library is empty!", True)
+            return
+        name, ok = QInputDialog.getItem(self, "Import Device Setup", "Setup:", names, 0, False)
+        if ok and name:
+            self.recall_setup(name)
+
+    def recall_setup(self, name):
+        try:
+            snapshot = self.setup_library.load(name)
+        except Exception as e:
+            self.log(f"Setup Load Error: {e}", True)
+            return
+        settings = snapshot['settings']
+        cmds = plan_recall(self._scope_state, settings, bool(snapshot['blob']))
+        if cmds is None:
+            self._pending_recalls[name] = settings
+            self.request_recall_setup.emit([], snapshot['blob'], name)
+        elif cmds:
+            self._pending_recalls[name] = settings
+            self.request_recall_setup.emit(cmds, b'', name)
+        else:
+            self.log(f"Setup '{name}' already matches the instrument.")
+            self.apply_synced_settings(settings, quiet=True)
+
+    def on_setup_recalled(self, name, mode, ms):
+        # GUI and cache follow the snapshot only once the instrument accepted it
+        settings = self._pending_recalls.pop(name, None)
+        if settings is not None:
+            self.apply_synced_settings(settings, quiet=True)
+        self.log(f"Setup '{name}' recalled via {mode} in {ms:.1f} ms")
@@ -0,0 +1,248 @@
+import ast
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from waveform import Waveform
+
+MATH_CHANNELS = ["M1", "M2", "M3", "M4"]
+SOURCE_CHANNELS = ["C1", "C2", "C3", "C4"]
+
+_BINARY_OPS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide, ast.Pow: np.power}
+_UNARY_OPS = {ast.USub: np.negative, ast.UAdd: None}
+FUNCTIONS = {
+    'ABS': np.absolute, 'SQRT': np.sqrt, 'SQUARE': np.square, 'EXP': np.exp, 'LOG': np.log,
+    'LOG10': np.log10, 'SIN': np.sin, 'COS': np.cos, 'TAN': np.tan, 'ATAN': np.arctan, 'SIGN': np.sign,
+}
+
+
+class MathProgram:
+    """
+    Compiled math expression: a flat list of NumPy ufunc steps. Operands are source
+    channels, constants or registers (reusable work buffers). A step whose operand is
+    a register writes its result back into that register (out=), so an expression
+    needs at most one buffer per nesting level instead of one temporary per operation.
+    """
+
+    def __init__(self, expression, steps, result, n_registers, sources):
+        self.expression = expression
+        self.steps = steps
+        self.result = result
+        self.n_registers = n_registers
+        self.sources = sources
+
+    def run(self, arrays, registers):
+        """Evaluates on equal-length source arrays into the given registers. Returns the result array."""
+        def value(ref):
+            kind, v = ref
+            return registers[v] if kind == 'reg' else arrays[v] if kind == 'src' else v
+
+        with np.errstate(all='ignore'):
+            for ufunc, operands, out in self.steps:
+                ufunc(*(value(r) for r in operands), out=registers[out])
+        return value(self.result)
+
+
+class _Compiler(ast.NodeVisitor):
+    def __init__(self):
+        self.steps = []
+        self.sources = []
+        self.n_registers = 0
+        self._free = []
+
+    def _alloc(self):
+        if self._free:
+            return self._free.pop()
+        self.n_registers += 1
+        return self.n_registers - 1
+
+    def _emit(self, ufunc, operands):
+        regs = [v for kind, v in operands if kind == 'reg']
+        out = regs[0] if regs else self._alloc()
+        self._free.extend(regs[1:])
+        self.steps.append((ufunc, operands, out))
+        return ('reg', out)
+
+    def generic_visit(self, node):
+        raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+
+    def visit_Expression(self, node):
+        return self.visit(node.body)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ValueError(f"Unsupported constant: {node.value!r}")
+        return ('const', float(node.value))
+
+    def visit_Name(self, node):
+        name = node.id.upper()
+        if name not in SOURCE_CHANNELS:
+            raise ValueError(f"Unknown channel: {node.id} (use {', '.join(SOURCE_CHANNELS)})")
+        if name not in self.sources:
+            self.sources.append(name)
+        return ('src', name)
+
+    def visit_BinOp(self, node):
+        op = _BINARY_OPS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        left, right = self.visit(node.left), self.visit(node.right)
+        if left[0] == right[0] == 'const':
+            return ('const', float(op(left[1], right[1])))
+        return self._emit(op, (left, right))
+
+    def visit_UnaryOp(self, node):
+        if type(node.op) not in _UNARY_OPS:
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        operand = self.visit(node.operand)
+        op = _UNARY_OPS[type(node.op)]
+        if op is None:
+            return operand
+        if operand[0] == 'const':
+            return ('const', -operand[1])
+        return self._emit(op, (operand,))
+
+    def visit_Call(self, node):
+        name = node.func.id.upper() if isinstance(node.func, ast.Name) else None
+        if name not in FUNCTIONS or len(node.args) != 1 or node.keywords:
+            raise ValueError(f"Unsupported function: {ast.unparse(node.func)} (use {', '.join(FUNCTIONS)} with one argument)")
+        operand = self.visit(node.args[0])
+        if operand[0] == 'const':
+            return ('const', float(FUNCTIONS[name](operand[1])))
+        return self._emit(FUNCTIONS[name], (operand,))
+
+
+@lru_cache(maxsize=64)
+def compile_expression(expression):
+    """
+    Parses a math expression over C1..C4 (e.g. 'C1 - C2', '(C1 * C2) / 50', 'abs(C3)')
+    once into a MathProgram. Raises ValueError for anything outside the whitelist.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Syntax error: {e.msg}") from None
+    compiler = _Compiler()
+    result = compiler.visit(tree)
+    if not compiler.sources:
+        raise ValueError("The expression must use at least one channel.")
+    return MathProgram(expression, compiler.steps, result, compiler.n_registers, tuple(compiler.sources))
+
+
+class MathEngine:
+    """
+    Host-side math channels (M1..M4) over downloaded waveforms.
+
+    Downloads are grouped by tag (preview, spectrum, persistence, ...). A math channel
+    is evaluated once all of its sources have a new acquisition under that tag; the
+    result is cached per (channel, tag) and reused by display, measurement and export
+    until one of the sources changes. Work buffers are kept per channel and reused as
+    long as the record length stays the same.
+    """
+
+    def __init__(self):
+        self.programs = {}
+        self._latest = {}        # (tag, source) -> (sequence, Waveform)
+        self._results = {}       # (math channel, tag) -> (source sequences, Waveform)
+        self._registers = {}     # math channel -> list of work buffers
+        self._last = {}          # math channel -> last evaluated Waveform
+        self._seq = 0
+
+    def set_expression(self, name, expression):
+        """Defines (or with an empty expression removes) a math channel. Raises ValueError if invalid."""
+        if not expression.strip():
+            self.programs.pop(name, None)
+        else:
+            self.programs[name] = compile_expression(expression.strip())
+        self._registers.pop(name, None)
+        self._last.pop(name, None)
+        for key in [k for k in self._results if k[0] == name]:
+            del self._results[key]
+
+    def sources(self, names=None):
+        """Physical channels needed by the given (default: all defined) math channels."""
+        needed = []
+        for name in self.programs if names is None else names:
+            program = self.programs.get(name)
+            if program is None:
+                continue
+            needed.extend(src for src in program.sources if src not in needed)
+        return needed
+
+    def add(self, wf):
+        """Registers a downloaded waveform. Returns the math Waveforms that became available with it."""
+        self._seq += 1
+        self._latest[(wf.tag, wf.channel)] = (self._seq, wf)
+        produced = []
+        for name, program in self.programs.items():
+            if wf.channel not in program.sources:
+                continue
+            seqs = self._source_seqs(program, wf.tag)
+            cached = self._results.get((name, wf.tag))
+            # Wait until every source has been downloaded again (no mixing of acquisitions)
+            if seqs is None or (cached is not None and any(new <= old for new, old in zip(seqs, cached[0]))):
+                continue
+            produced.append(self.result(name, wf.tag))
+        return produced
+
+    def _source_seqs(self, program, tag):
+        entries = [self._latest.get((tag, src)) for src in program.sources]
+        if any(e is None for e in entries):
+            return None
+        return tuple(e[0] for e in entries)
+
+    def result(self, name, tag):
+        """Math waveform for the latest acquisitions under `tag` (cached), or None if sources are missing."""
+        program = self.programs.get(name)
+        if program is None:
+            return None
+        seqs = self._source_seqs(program, tag)
+        if seqs is None:
+            return None
+        cached = self._results.get((name, tag))
+        if cached is not None and cached[0] == seqs:
+            return cached[1]
+        wf = self._evaluate(name, program, [self._latest[(tag, src)][1] for src in program.sources], tag)
+        self._results[(name, tag)] = (seqs, wf)
+        self._last[name] = wf
+        return wf
+
+    def latest(self, name):
+        """Most recently evaluated result of a math channel (any tag), or None."""
+        return self._last.get(name)
+
+    def _evaluate(self, name, program, waveforms, tag):
+        ref = waveforms[0]
+        if any(w.dt != ref.dt for w in waveforms):
+            raise ValueError(f"{name}: sources have different sample intervals.")
+        n = min(len(w) for w in waveforms)
+        arrays = {w.channel: w.volts[:n] for w in waveforms}
+        registers = self._registers.get(name)
+        if registers is None or len(registers) != program.n_registers or (registers and len(registers[0]) != n):
+            registers = [np.empty(n, dtype=np.float32) for _ in range(program.n_registers)]
+            self._registers[name] = registers
+        if program.result[0] == 'reg':
+            # The result register is handed out with the cached Waveform: give it a fresh buffer
+            registers[program.result[1]] = np.empty(n, dtype=np.float32)
+        volts = program.run(arrays, registers)
+        wf = Waveform(name, volts, ref.dt, ref.t0, ref.first_point, ref.sparsing)
+        wf.tag = tag
+        return wf
+
+    def reset(self):
+        self._latest = {}
+        self._results = {}
+        self._last = {}
+
+
+def write_math_bundle(bundle_dir, waveforms, expressions):
+    """Stores math channel results (`<M>.npy`) with their expressions and time scale in `math.json`."""
+    os.makedirs(bundle_dir, exist_ok=True)
+    info = {}
+    for wf in waveforms:
+        np.save(os.path.join(bundle_dir, f"{wf.channel}.npy"), wf.volts)
+        info[wf.channel] = dict(wf.describe(), expression=expressions.get(wf.channel, ""), tag=wf.tag)
+    with open(os.path.join(bundle_dir, "math.json"), 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(info.items())), f, indent=2)
@@ -0,0 +1,151 @@
+from collections import deque
+
+import numpy as np
+
+
+class MeasurementHistory:
+    """
+    History of one measurement slot, backed by fixed-size NumPy ring buffers.
+
+    - The last `window` readings are summarized with sliding Welford statistics
+      (mean / std in O(1) per sample) and monotonic queues (min / max, amortized O(1)).
+    - Lifetime statistics and the linear drift (least-squares slope) are kept as
+      running sums, so they cover the whole run even after the ring wraps.
+    """
+
+    def __init__(self, capacity=100000, window=100):
+        self.capacity = capacity
+        self.times = np.empty(capacity, dtype=np.float64)
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.total = 0  # samples ever added; the ring holds the last min(total, capacity)
+        self.set_window(window)
+        self._t_ref = None
+        self._n = 0
+        self._sum_t = self._sum_v = self._sum_tt = self._sum_tv = 0.0
+        self._life_mean = self._life_m2 = 0.0
+        self.life_min = np.inf
+        self.life_max = -np.inf
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def set_window(self, window):
+        """Changes the statistics window, rebuilding it once from the ring buffer."""
+        self.window = max(1, min(int(window), self.capacity))
+        self._win_n = 0
+        self._win_mean = self._win_m2 = 0.0
+        self._min_q = deque()
+        self._max_q = deque()
+        start = max(0, self.total - self.window)
+        for seq in range(start, self.total):
+            self._window_push(seq, self.values[seq % self.capacity], None)
+
+    def _window_push(self, seq, value, leaving):
+        if leaving is None:
+            self._win_n += 1
+            delta = value - self._win_mean
+            self._win_mean += delta / self._win_n
+            self._win_m2 += delta * (value - self._win_mean)
+        else:
+            old_mean = self._win_mean
+            self._win_mean += (value - leaving) / self._win_n
+            self._win_m2 += (value - leaving) * (value - self._win_mean + leaving - old_mean)
+            self._win_m2 = max(self._win_m2, 0.0)
+
+        oldest = seq - self.window + 1
+        while self._min_q and self._min_q[-1][1] >= value: self._min_q.pop()
+        while self._max_q and self._max_q[-1][1] <= value: self._max_q.pop()
+        self._min_q.append((seq, value))
+        self._max_q.append((seq, value))
+        while self._min_q[0][0] < oldest: self._min_q.popleft()
+        while self._max_q[0][0] < oldest: self._max_q.popleft()
+
+    def add(self, t, value):
+        """Stores one reading. NaN / inf (no valid result) is skipped and returns False."""
+        if not np.isfinite(value):
+            return False
+        seq = self.total
+        leaving = None
+        if self._win_n >= self.window:
+            leaving = self.values[(seq - self.window) % self.capacity]
+        idx = seq % self.capacity
+        self.times[idx] = t
+        self.values[idx] = value
+        self.total += 1
+        self._window_push(seq, value, leaving)
+
+        if self._t_ref is None:
+            self._t_ref = t
+        dt = t - self._t_ref
+        self._n += 1
+        self._sum_t += dt; self._sum_v += value
+        self._sum_tt += dt * dt; self._sum_tv += dt * value
+        delta = value - self._life_mean
+        self._life_mean += delta / self._n
+        self._life_m2 += delta * (value - self._life_mean)
+        self.life_min = min(self.life_min, value)
+        self.life_max = max(self.life_max, value)
+        return True
+
+    def stats(self):
+        """Window statistics plus lifetime mean/std and drift in units per hour."""
+        if self._win_n == 0:
+            return None
+        n = self._n
+        denom = n * self._sum_tt - self._sum_t ** 2
+        drift = (n * self._sum_tv - self._sum_t * self._sum_v) / denom * 3600.0 if n > 1 and denom > 0 else 0.0
+        return {
+            'n': self._win_n,
+            'mean': self._win_mean,
+            'std': np.sqrt(self._win_m2 / (self._win_n - 1)) if self._win_n > 1 else 0.0,
+            'min': self._min_q[0][1],
+            'max': self._max_q[0][1],
+            'total': n,
+            'life_mean': self._life_mean,
+            'life_std': np.sqrt(self._life_m2 / (n - 1)) if n > 1 else 0.0,
+            'drift_per_hour': drift,
+        }
+
+    def ordered(self):
+        """Returns (times, values) of the ring in chronological order (copies)."""
+        n = len(self)
+        if self.total <= self.capacity:
+            return self.times[:n].copy(), self.values[:n].copy()
+        head = self.total % self.capacity
+        return np.roll(self.times, -head), np.roll(self.values, -head)
+
+    def downsample(self, max_points):
+        """
+        Min/max envelope of the history for display: at most ~2*max_points points
+        that keep every spike visible regardless of the history length.
+        """
+        t, v = self.ordered()
+        buckets = max(1, max_points // 2)
+        if len(v) <= 2 * buckets:
+            return t, v
+        size = len(v) // buckets
+        usable = size * buckets
+        vb = v[len(v) - usable:].reshape(buckets, size)
+        tb = t[len(t) - usable:].reshape(buckets, size)
+        rows = np.arange(buckets)
+        i_min = vb.argmin(axis=1)
+        i_max = vb.argmax(axis=1)
+        first = np.minimum(i_min, i_max)
+        second = np.maximum(i_min, i_max)
+        out_t = np.column_stack((tb[rows, first], tb[rows, second])).ravel()
+        out_v = np.column_stack((vb[rows, first], vb[rows, second])).ravel()
+        return out_t, out_v
+
+
+def export_histories(path, histories):
+    """
+    Writes every history to one file: `.npz` (one Nx2 array per series)
+    or CSV in long format (series, unix time, value).
+    """
+    if path.lower().endswith(".npz"):
+        np.savez(path, **{label: np.column_stack(h.ordered()) for label, h in histories.items()})
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("series,time,value\n")
+        for label, h in histories.items():
+            np.savetxt(f, np.column_stack(h.ordered()), fmt=f"{label},%.6f,%.9g")
@@ -0,0 +1,100 @@
+import json
+import os
+import time
+
+import numpy as np
+
+LOG_MAGIC = b'OSCLOG1\0'
+HEADER_SIZE = 4096
+
+
+def _row_dtype(columns):
+    return np.dtype([('t', '<f8')] + [(name, '<f8') for name in columns])
+
+
+def _read_header(f):
+    raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or not raw.startswith(LOG_MAGIC):
+        raise ValueError("Not a measurement log file.")
+    return json.loads(raw[len(LOG_MAGIC):].rstrip(b'\0').decode('utf-8'))
+
+
+class MeasurementLogger:
+    """
+    Appendable binary log of measurement rows (float64 time + one float64 per column).
+
+    Rows are buffered in a NumPy block and written in batches. Time stamps are
+    derived from time.monotonic(), anchored to the wall clock when the logger opens,
+    so they never jump backwards within a session. Reopening an existing file with
+    the same columns appends to it (a partially written last row is discarded).
+    """
+
+    def __init__(self, path, columns, flush_rows=256, flush_interval=5.0):
+        self.path = path
+        self.columns = list(columns)
+        self.dtype = _row_dtype(self.columns)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._buf = np.zeros(flush_rows, dtype=self.dtype)
+        self._n = 0
+        self.rows_written = 0
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                meta = _read_header(f)
+            if meta['columns'] != self.columns:
+                raise ValueError(f"Log file has columns {meta['columns']}, expected {self.columns}.")
+            self.rows_written = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+            self._file = open(path, 'r+b')
+            self._file.truncate(HEADER_SIZE + self.rows_written * self.dtype.itemsize)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            meta = {'columns': self.columns, 'created': time.strftime('%Y-%m-%d %H:%M:%S')}
+            header = LOG_MAGIC + json.dumps(meta).encode('utf-8')
+            if len(header) > HEADER_SIZE:
+                raise ValueError("Too many columns for the log header.")
+            self._file = open(path, 'wb')
+            self._file.write(header.ljust(HEADER_SIZE, b'\0'))
+
+        self._epoch_base = time.time()
+        self._mono_base = time.monotonic()
+        self._last_flush = self._mono_base
+
+    def add(self, mono_t, values):
+        row = self._buf[self._n]
+        row['t'] = self._epoch_base + (mono_t - self._mono_base)
+        for name, v in zip(self.columns, values):
+            row[name] = v
+        self._n += 1
+        if self._n >= self.flush_rows or mono_t - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._n:
+            self._file.write(self._buf[:self._n].tobytes())
+            self._file.flush()
+            self.rows_written += self._n
+            self._n = 0
+        self._last_flush = time.monotonic()
+
+    @property
+    def rows_logged(self):
+        return self.rows_written + self._n
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def open_log(path):
+    """
+    Memory-maps a measurement log for analysis. Returns (meta, records) where
+    records is a read-only structured array with a 't' field plus one field per column.
+    """
+    with open(path, 'rb') as f:
+        meta = _read_header(f)
+    dtype = _row_dtype(meta['columns'])
+    n_rows = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+    if n_rows == 0:
+        return meta, np.zeros(0, dtype=dtype)
+    return meta, np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(n_rows,))
@@ -0,0 +1,126 @@
+import numpy as np
+from PyQt6.QtGui import QImage, qRgb
+
+
+def _heat_color_table():
+    """256-entry black -> blue -> green -> yellow -> red -> white table."""
+    stops = [(0, (0, 0, 0)), (40, (13, 17, 90)), (100, (31, 111, 235)), (160, (63, 185, 80)),
+             (210, (227, 179, 65)), (240, (248, 81, 73)), (255, (255, 255, 255))]
+    table = []
+    for i in range(256):
+        for (p0, c0), (p1, c1) in zip(stops, stops[1:]):
+            if p0 <= i <= p1:
+                f = (i - p0) / max(1, p1 - p0)
+                table.append(qRgb(*(int(a + (b - a) * f) for a, b in zip(c0, c1))))
+                break
+    return table
+
+
+HEAT_COLORS = _heat_color_table()
+
+
+def recover_clock(t, v, ui=None, threshold=None):
+    """
+    Estimates the unit interval and phase of a data signal from its threshold crossings.
+    With a known `ui` only the phase is fitted. Returns (ui, phase) in seconds,
+    or None if there are too few transitions.
+    """
+    if threshold is None:
+        threshold = 0.5 * (float(np.max(v)) + float(np.min(v)))
+    above = v >= threshold
+    idx = np.flatnonzero(above[1:] != above[:-1])
+    if len(idx) < 4:
+        return None
+    # Linear interpolation of the crossing instants
+    v0, v1 = v[idx], v[idx + 1]
+    frac = (threshold - v0) / np.where(v1 != v0, v1 - v0, 1.0)
+    tc = t[idx] + frac * (t[idx + 1] - t[idx])
+
+    if ui:
+        k = np.round((tc - tc[0]) / ui)
+        return float(ui), float(np.mean(tc - k * ui))
+
+    intervals = np.diff(tc)
+    base = np.percentile(intervals, 10)
+    if base <= 0:
+        return None
+    ui = np.median(intervals / np.maximum(1.0, np.round(intervals / base)))
+    # Refine UI and phase with a least-squares fit of crossing time vs. bit index
+    k = np.round((tc - tc[0]) / ui)
+    if k[-1] > 0:
+        ui, phase = np.polyfit(k, tc, 1)
+    else:
+        phase = tc[0]
+    return float(ui), float(phase)
+
+
+class PersistenceEngine:
+    """
+    Accumulates waveforms into a 2D time/voltage histogram (NumPy bincount), with
+    optional exponential decay. In eye mode the time axis is folded modulo two unit
+    intervals, using a fixed UI or one recovered from the data.
+    """
+
+    def __init__(self, width=640, height=256, decay=0.0):
+        self.width = width
+        self.height = height
+        self.decay = decay
+        self.eye_mode = False
+        self.ui = None          # fixed unit interval in seconds (None: recover from data)
+        self.hist = np.zeros((height, width), dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.hist.fill(0.0)
+        self.count = 0
+        self.x_range = None
+        self.v_range = None
+        self.last_clock = None
+
+    def accumulate(self, t, v):
+        """Adds one acquisition (time and voltage arrays). Returns False if it could not be binned."""
+        v = np.asarray(v, dtype=np.float64)
+        t = np.asarray(t, dtype=np.float64)
+
+        if self.eye_mode:
+            clock = recover_clock(t, v, self.ui)
+            if clock is None:
+                return False
+            ui, phase = clock
+            self.last_clock = clock
+            x = np.mod(t - phase + 0.5 * ui, 2.0 * ui)
+            x_range = (0.0, 2.0 * ui)
+        else:
+            x = t - t[0]
+            x_range = (0.0, float(x[-1]) if len(x) > 1 else 1.0)
+
+        if self.x_range is None or self.v_range is None:
+            v_min, v_max = float(v.min()), float(v.max())
+            margin = 0.1 * max(v_max - v_min, 1e-6)
+            self.v_range = (v_min - margin, v_max + margin)
+            self.x_range = x_range
+
+        x0, x1 = self.x_range
+        y0, y1 = self.v_range
+        xi = ((x - x0) * (self.width / (x1 - x0))).astype(np.intp)
+        yi = ((y1 - v) * (self.height / (y1 - y0))).astype(np.intp)
+        valid = (xi >= 0) & (xi < self.width) & (yi >= 0) & (yi < self.height)
+        counts = np.bincount(yi[valid] * self.width + xi[valid], minlength=self.width * self.height)
+
+        if self.decay > 0.0:
+            self.hist *= (1.0 - self.decay)
+        self.hist += counts.reshape(self.height, self.width)
+        self.count += 1
+        return True
+
+    def render(self):
+        """Heat-map QImage of the histogram (log-compressed so rare events stay visible)."""
+        peak = float(self.hist.max())
+        if peak > 0:
+            level = np.log1p(self.hist) * (255.0 / np.log1p(peak))
+            idx = level.astype(np.uint8)
+        else:
+            idx = np.zeros((self.height, self.width), dtype=np.uint8)
+        img = QImage(idx.data, self.width, self.height, self.width, QImage.Format.Format_Indexed8)
+        img.setColorTable(HEAT_COLORS)
+        return img.copy()
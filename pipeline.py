@@ -0,0 +1,141 @@
+import multiprocessing as mp
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from spectrum import rms_spectrum
+
+
+def measure_waveform(x, dt):
+    """Host-side basic measurements of one record."""
+    v_max = float(x.max())
+    v_min = float(x.min())
+    mean = float(x.mean())
+    rms = float(np.sqrt(np.dot(x, x) / len(x)))
+    freq = float('nan')
+    above = x >= 0.5 * (v_max + v_min)
+    rising = np.flatnonzero(~above[:-1] & above[1:])
+    if len(rising) >= 2:
+        freq = (len(rising) - 1) / ((rising[-1] - rising[0]) * dt)
+    return {'pkpk': v_max - v_min, 'max': v_max, 'min': v_min, 'mean': mean, 'rms': rms, 'freq': freq}
+
+
+def _attach(shm_name):
+    """
+    Attaches to a block without registering it with the resource tracker: only the
+    creating process owns (and unlinks) it. Before Python 3.13 every attach registers
+    the block, and a pool process would then report it as leaked or unlink it twice.
+    The spawned pool shares the parent's tracker, so unregistering afterwards would
+    drop the parent's own registration instead.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=shm_name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == "shared_memory" else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name=shm_name)
+    finally:
+        resource_tracker.register = register
+
+
+def _analyze(shm_name, shape, dtype, dt, tasks, window):
+    """
+    Runs in a pool process: attaches to the shared buffer (no copy) and returns small
+    results. 'fft' returns the RMS magnitude spectrum itself (n / 2 + 1 values).
+    """
+    t0 = time.perf_counter()
+    shm = _attach(shm_name)
+    try:
+        x = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        result = {}
+        if 'measure' in tasks:
+            result['measure'] = measure_waveform(x, dt)
+        if 'spectrum' in tasks:
+            freqs, mag = rms_spectrum(x, dt)
+            peak = int(mag[1:].argmax()) + 1 if len(mag) > 1 else 0
+            result['spectrum'] = {'peak_freq': float(freqs[peak]), 'peak_vrms': float(mag[peak])}
+        if 'fft' in tasks:
+            result['fft'] = {'window': window, 'mag': rms_spectrum(x, dt, window)[1]}
+        del x
+    finally:
+        shm.close()
+    result['elapsed_ms'] = (time.perf_counter() - t0) * 1000.0
+    result['pid'] = os.getpid()
+    return result
+
+
+class AnalysisPipeline(QObject):
+    """
+    CPU-bound analysis of waveform buffers on a process pool. Each buffer is copied
+    once into a shared-memory block; the pool processes attach to it by name, so
+    large arrays are never pickled. Results come back on `result_ready` (emitted
+    from the pool's callback thread, delivered queued to the GUI thread).
+    Blocks are recycled per size. If more than `max_in_flight` jobs are pending,
+    submit() drops the buffer instead of queueing.
+    """
+    result_ready = pyqtSignal(dict)
+    error = pyqtSignal(str)
+
+    def __init__(self, workers=None, max_in_flight=None, parent=None):
+        super().__init__(parent)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        # spawn: never fork a process that is running Qt threads
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=mp.get_context("spawn"))
+        self._free_blocks = {}
+        self._all_blocks = []
+        # Written by one thread each (GUI / pool callback), so no lock is needed
+        self._submitted = 0
+        self._completed = 0
+        self.dropped = 0
+
+    def _get_block(self, nbytes):
+        free = self._free_blocks.setdefault(nbytes, deque())
+        try:
+            return free.pop()
+        except IndexError:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+            self._all_blocks.append(shm)
+            return shm
+
+    def submit(self, wf, tasks=('measure',), window="hann"):
+        """Queues one Waveform for analysis (FFT window for 'fft'). Returns the Future, or None if dropped."""
+        if self._submitted - self._completed >= self.max_in_flight:
+            self.dropped += 1
+            return None
+        volts = np.ascontiguousarray(wf.volts)
+        shm = self._get_block(volts.nbytes)
+        np.ndarray(volts.shape, dtype=volts.dtype, buffer=shm.buf)[:] = volts
+        self._submitted += 1
+        meta = {'channel': wf.channel, 'tag': wf.tag, 'points': len(volts), 'dt': wf.dt}
+        future = self.executor.submit(_analyze, shm.name, volts.shape, volts.dtype.str, wf.dt, tuple(tasks), window)
+        future.add_done_callback(lambda f: self._on_done(f, shm, volts.nbytes, meta))
+        return future
+
+    def _on_done(self, future, shm, nbytes, meta):
+        self._completed += 1
+        self._free_blocks[nbytes].append(shm)
+        try:
+            result = future.result()
+        except Exception as e:
+            self.error.emit(f"Analysis Error on {meta['channel']}: {str(e)}")
+            return
+        result.update(meta)
+        self.result_ready.emit(result)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for shm in self._all_blocks:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._all_blocks = []
+        self._free_blocks = {}
@@ -0,0 +1,11 @@
+def parse_num(val_str):
+    """Number in an instrument reply (e.g. '1.00E-06S'); 0.0 if there is none."""
+    if not val_str: return 0.0
+    clean = "".join(c for c in val_str if c in "0123456789.eE+-")
+    try: return float(clean)
+    except: return 0.0
+
+
+def format_num(value):
+    """Bare number for a remote command (no unit suffix), e.g. 0.5 -> '0.5', 1e-06 -> '1E-06'."""
+    return f"{value:.9G}"
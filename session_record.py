@@ -0,0 +1,201 @@
+import re
+import struct
+import time
+from collections import defaultdict
+
+import pyvisa.constants
+import pyvisa.errors
+
+SESSION_MAGIC = b'OSCREC1\0'
+# op, start offset (s), duration (s), request length, response length
+RECORD_HEADER = struct.Struct('<BdfII')
+
+OP_WRITE, OP_QUERY, OP_READ_RAW, OP_WRITE_RAW, OP_CLEAR = 1, 2, 3, 4, 5
+OP_NAMES = {OP_WRITE: "write", OP_QUERY: "query", OP_READ_RAW: "read_raw", OP_WRITE_RAW: "write_raw", OP_CLEAR: "clear"}
+
+_REPLAY_RE = re.compile(r'^replay(?:@([0-9.]+))?:(.+)$', re.IGNORECASE)
+
+
+def parse_replay_address(address):
+    """
+    Parses 'replay:<path>' or 'replay@<latency scale>:<path>' (scale 1 = original timing,
+    0 = no delay). Returns (path, scale), or None for a normal instrument address.
+    """
+    m = _REPLAY_RE.match(address.strip())
+    if not m:
+        return None
+    return m.group(2), float(m.group(1)) if m.group(1) else 1.0
+
+
+def load_session(path):
+    """Returns the records of a session file as a list of (op, t, duration, request, response)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(SESSION_MAGIC):
+        raise ValueError("Not a VISA session recording.")
+    records = []
+    pos = len(SESSION_MAGIC)
+    while pos + RECORD_HEADER.size <= len(data):
+        op, t, duration, n_req, n_resp = RECORD_HEADER.unpack_from(data, pos)
+        pos += RECORD_HEADER.size
+        if pos + n_req + n_resp > len(data):
+            break  # truncated last record (recording interrupted)
+        request = data[pos:pos + n_req]
+        response = data[pos + n_req:pos + n_req + n_resp]
+        pos += n_req + n_resp
+        records.append((op, t, duration, request, response))
+    return records
+
+
+class RecordingInstrument:
+    """
+    Proxy around a VISA resource that logs every write, query, read_raw and write_raw
+    with its response bytes and timing. A read_raw is keyed by the command written
+    before it (e.g. SCDP), so replay can serve it without relying on call order.
+    Any other attribute (timeout, close, ...) is forwarded to the resource.
+    """
+
+    def __init__(self, instrument, path):
+        object.__setattr__(self, '_instrument', instrument)
+        object.__setattr__(self, '_file', open(path, 'wb'))
+        object.__setattr__(self, '_t0', time.perf_counter())
+        object.__setattr__(self, '_last_write', b'')
+        object.__setattr__(self, 'path', path)
+        self._file.write(SESSION_MAGIC)
+
+    def __getattr__(self, name):
+        return getattr(self._instrument, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._instrument, name, value)
+
+    def _log(self, op, start, request, response):
+        end = time.perf_counter()
+        self._file.write(RECORD_HEADER.pack(op, start - self._t0, end - start, len(request), len(response)))
+        self._file.write(request)
+        self._file.write(response)
+
+    def write(self, cmd):
+        start = time.perf_counter()
+        result = self._instrument.write(cmd)
+        request = cmd.encode('utf-8')
+        object.__setattr__(self, '_last_write', request)
+        self._log(OP_WRITE, start, request, b'')
+        return result
+
+    def query(self, cmd):
+        start = time.perf_counter()
+        reply = self._instrument.query(cmd)
+        self._log(OP_QUERY, start, cmd.encode('utf-8'), reply.encode('utf-8'))
+        return reply
+
+    def read_raw(self, *args):
+        start = time.perf_counter()
+        data = self._instrument.read_raw(*args)
+        self._log(OP_READ_RAW, start, self._last_write, bytes(data))
+        return data
+
+    def write_raw(self, data):
+        start = time.perf_counter()
+        result = self._instrument.write_raw(data)
+        # The payload itself (e.g. a panel setup blob) is not needed to replay the session
+        self._log(OP_WRITE_RAW, start, bytes(data[:32]), b'')
+        return result
+
+    def clear(self):
+        start = time.perf_counter()
+        self._instrument.clear()
+        self._log(OP_CLEAR, start, b'', b'')
+
+    def log_connect(self, idn, writes=()):
+        """
+        Logs the opening sequence of a connection (clear, *IDN? with the given reply,
+        setup writes) without sending it. A recording started on an open session has
+        no handshake of its own, and replay needs it to connect.
+        """
+        start = time.perf_counter()
+        self._log(OP_CLEAR, start, b'', b'')
+        self._log(OP_QUERY, start, b'*IDN?', idn.encode('utf-8'))
+        for cmd in writes:
+            self._log(OP_WRITE, start, cmd.encode('utf-8'), b'')
+
+    def stop(self):
+        """Closes the recording and returns the wrapped resource."""
+        if not self._file.closed:
+            self._file.close()
+        return self._instrument
+
+    def close(self):
+        self.stop()
+        self._instrument.close()
+
+
+class ReplayInstrument:
+    """
+    Stand-in for a VISA resource that serves the responses of a recorded session.
+
+    Responses are matched by (operation, request), in recorded order per request,
+    and wrap around when a request is issued more often than it was recorded.
+    Each call waits its recorded duration times `latency_scale` (1 = original,
+    0 = as fast as possible). A query that was never recorded raises a VISA timeout.
+    """
+
+    def __init__(self, path, latency_scale=1.0):
+        self.path = path
+        self.latency_scale = latency_scale
+        self.timeout = 5000
+        self.calls = 0
+        self.misses = 0
+        self._last_write = b''
+        self._replies = defaultdict(list)
+        for op, _, duration, request, response in load_session(path):
+            self._replies[(op, request)].append((duration, response))
+        self._cursor = defaultdict(int)
+
+    def _serve(self, op, request):
+        self.calls += 1
+        replies = self._replies.get((op, request))
+        if not replies:
+            self.misses += 1
+            if op in (OP_QUERY, OP_READ_RAW):
+                raise pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+            return b''
+        i = self._cursor[(op, request)]
+        self._cursor[(op, request)] = (i + 1) % len(replies)
+        duration, response = replies[i]
+        if self.latency_scale > 0:
+            time.sleep(duration * self.latency_scale)
+        return response
+
+    def write(self, cmd):
+        request = cmd.encode('utf-8')
+        self._last_write = request
+        self._serve(OP_WRITE, request)
+        return len(request)
+
+    def query(self, cmd):
+        return self._serve(OP_QUERY, cmd.encode('utf-8')).decode('utf-8')
+
+    def read_raw(self, *args):
+        return self._serve(OP_READ_RAW, self._last_write)
+
+    def write_raw(self, data):
+        self._serve(OP_WRITE_RAW, bytes(data[:32]))
+        return len(data)
+
+    def clear(self):
+        self._serve(OP_CLEAR, b'')
+
+    def close(self):
+        pass
+
+
+def session_summary(records):
+    """Per-operation counts, bytes and total time of a recording (for reports)."""
+    summary = {}
+    for op, _, duration, request, response in records:
+        s = summary.setdefault(OP_NAMES.get(op, str(op)), {'count': 0, 'bytes': 0, 'seconds': 0.0})
+        s['count'] += 1
+        s['bytes'] += len(request) + len(response)
+        s['seconds'] += duration
+    return summary
@@ -0,0 +1,139 @@
+import json
+import os
+import re
+import time
+
+from scpi_values import parse_num, format_num
+
+# Above this many differing commands, pushing the panel setup blob in one transfer is faster
+MAX_DIFF_COMMANDS = 8
+
+_CHANNEL_KEYS = ("TRACE", "VOLT_DIV", "OFFSET", "COUPLING", "BANDWIDTH_LIMIT", "INVERT")
+# Replies of these carry a unit suffix ('5.00E-01V'), which remote commands must not
+_NUMERIC_KEYS = ("TIME_DIV", "TRIG_LVL", ":VOLT_DIV", ":OFFSET")
+
+
+def _is_numeric(key):
+    return key.endswith(_NUMERIC_KEYS)
+
+
+def _values_equal(a, b, numeric=False):
+    if a is None or b is None:
+        return a is b
+    if numeric:
+        a, b = parse_num(a), parse_num(b)
+        return abs(a - b) <= 1e-9 * max(1.0, abs(a))
+    try:
+        return abs(float(a) - float(b)) <= 1e-9 * max(1.0, abs(float(a)))
+    except ValueError:
+        return str(a).strip().upper() == str(b).strip().upper()
+
+
+def _command_value(settings, key):
+    return format_num(parse_num(settings[key])) if _is_numeric(key) else settings[key]
+
+
+def settings_diff(current, target):
+    """Returns the keys of `target` whose value differs from (or is unknown in) `current`."""
+    return [k for k, v in target.items() if not _values_equal(current.get(k), v, _is_numeric(k))]
+
+
+def settings_to_commands(settings, keys):
+    """
+    Builds the remote commands that apply `keys` of a settings dict in the
+    `fetch_all_settings` format (e.g. 'C1:VOLT_DIV', 'TRIG_SRC').
+    """
+    cmds = []
+    keys = set(keys)
+    if 'TIME_DIV' in keys:
+        cmds.append(f"TIME_DIV {_command_value(settings, 'TIME_DIV')}")
+    for ch in ["C1", "C2", "C3", "C4"]:
+        for item in _CHANNEL_KEYS:
+            key = f"{ch}:{item}"
+            if key in keys:
+                cmds.append(f"{key} {_command_value(settings, key)}")
+    if 'TRIG_MODE' in keys:
+        cmds.append(f"TRIG_MODE {settings['TRIG_MODE']}")
+    if keys & {'TRIG_TYPE', 'TRIG_SRC'} and 'TRIG_TYPE' in settings and 'TRIG_SRC' in settings:
+        cmds.append(f"TRIG_SELECT {settings['TRIG_TYPE']},SR,{settings['TRIG_SRC']}")
+    if 'TRIG_LVL' in keys and 'TRIG_SRC' in settings:
+        cmds.append(f"{settings['TRIG_SRC']}:TRIG_LEVEL {_command_value(settings, 'TRIG_LVL')}")
+    return cmds
+
+
+def plan_recall(current, target, has_blob, max_commands=MAX_DIFF_COMMANDS):
+    """
+    Chooses the fastest way to reach `target` from the cached `current` state.
+    Returns the list of differing commands, or None if the setup blob should be pushed instead.
+    """
+    cmds = settings_to_commands(target, settings_diff(current, target))
+    if len(cmds) <= max_commands or not has_blob:
+        return cmds
+    return None
+
+
+class SetupLibrary:
+    """
+    Local indexed library of setup snapshots. Each snapshot stores the instrument
+    panel setup blob (`<name>.lss`) and the settings/GUI state (`<name>.json`).
+    Loaded snapshots are kept in memory so repeated recalls do not touch the disk.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.index_path = os.path.join(root_dir, "index.json")
+        self._cache = {}
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+
+    def _write_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def names(self):
+        return sorted(self.index, key=lambda n: self.index[n]['created'], reverse=True)
+
+    def save(self, name, settings, gui_state, blob):
+        os.makedirs(self.root_dir, exist_ok=True)
+        stem = re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_') or "setup"
+        if name not in self.index:
+            taken = {e['file'] for e in self.index.values()}
+            base, i = stem, 1
+            while stem in taken:
+                i += 1
+                stem = f"{base}_{i}"
+        else:
+            stem = self.index[name]['file']
+
+        with open(os.path.join(self.root_dir, stem + ".lss"), 'wb') as f:
+            f.write(blob)
+        with open(os.path.join(self.root_dir, stem + ".json"), 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'gui_state': gui_state}, f, indent=2)
+
+        self.index[name] = {'file': stem, 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'blob_size': len(blob)}
+        self._write_index()
+        self._cache[name] = {'settings': settings, 'gui_state': gui_state, 'blob': blob}
+
+    def load(self, name):
+        if name not in self._cache:
+            stem = os.path.join(self.root_dir, self.index[name]['file'])
+            with open(stem + ".json", 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            with open(stem + ".lss", 'rb') as f:
+                snapshot['blob'] = f.read()
+            self._cache[name] = snapshot
+        return self._cache[name]
+
+    def remove(self, name):
+        entry = self.index.pop(name)
+        self._cache.pop(name, None)
+        for ext in (".lss", ".json"):
+            try:
+                os.remove(os.path.join(self.root_dir, entry['file'] + ext))
+            except FileNotFoundError:
+                pass
+        self._write_index()
@@ -0,0 +1,137 @@
+from functools import lru_cache
+
+import numpy as np
+
+WINDOWS = ["hann", "hamming", "blackman", "flattop", "rect"]
+SCALES = ["dBV", "dBm", "Vrms"]
+AVERAGING = ["none", "linear", "exponential", "peak"]
+
+_FLATTOP = (0.21557895, 0.41663158, 0.277263158, 0.083578947, 0.006947368)
+
+
+@lru_cache(maxsize=32)
+def get_window(name, n):
+    """Returns (window, amplitude correction) for a record length; cached per (name, n)."""
+    if name == "hann":
+        w = np.hanning(n)
+    elif name == "hamming":
+        w = np.hamming(n)
+    elif name == "blackman":
+        w = np.blackman(n)
+    elif name == "flattop":
+        k = 2.0 * np.pi * np.arange(n) / max(1, n - 1)
+        w = sum(((-1) ** i) * a * np.cos(i * k) for i, a in enumerate(_FLATTOP))
+    elif name == "rect":
+        w = np.ones(n)
+    else:
+        raise ValueError(f"Unknown window: {name}")
+    # Single-sided RMS spectrum: 2 / sum(w) for peak amplitude, / sqrt(2) for RMS
+    scale = np.full(n // 2 + 1, np.sqrt(2.0) / w.sum())
+    scale[0] /= np.sqrt(2.0)
+    if n % 2 == 0:
+        scale[-1] /= np.sqrt(2.0)
+    w.setflags(write=False)
+    scale.setflags(write=False)
+    return w, scale
+
+
+@lru_cache(maxsize=32)
+def get_freqs(n, dt):
+    f = np.fft.rfftfreq(n, dt)
+    f.setflags(write=False)
+    return f
+
+
+def rms_spectrum(volts, dt, window="hann"):
+    """
+    Windowed real FFT of one record (1-D) or a batch of records (2-D, one per row,
+    e.g. channels or acquisitions). Returns (freqs, RMS volts per bin).
+    """
+    x = np.asarray(volts, dtype=np.float64)
+    n = x.shape[-1]
+    w, scale = get_window(window, n)
+    spec = np.fft.rfft(x * w, axis=-1)
+    mag = np.abs(spec)
+    mag *= scale
+    return get_freqs(n, float(dt)), mag
+
+
+def to_scale(v_rms, scale, load_ohms=50.0):
+    """Converts RMS volts to the display scale (dBV, dBm into load_ohms, or Vrms)."""
+    if scale == "Vrms":
+        return v_rms
+    floor = np.maximum(v_rms, 1e-15)
+    if scale == "dBV":
+        return 20.0 * np.log10(floor)
+    if scale == "dBm":
+        return 10.0 * np.log10(floor * floor / load_ohms / 1e-3)
+    raise ValueError(f"Unknown scale: {scale}")
+
+
+def decimate_peaks(freqs, values, max_points):
+    """Keeps the maximum of each bucket so narrow spectral lines survive display decimation."""
+    n = len(values)
+    if n <= max_points:
+        return freqs, values
+    size = int(np.ceil(n / max_points))
+    usable = (n // size) * size
+    peaks = values[:usable].reshape(-1, size).max(axis=1)
+    return freqs[:usable:size], peaks
+
+
+class SpectrumAnalyzer:
+    """
+    Averages RMS spectra per source across acquisitions. Averaging is done on the
+    linear scale: 'linear' (power mean), 'exponential' (weight `alpha`) or 'peak' hold.
+    The state of a source resets when its record length or sample interval changes.
+    """
+
+    def __init__(self, window="hann", averaging="none", alpha=0.25):
+        self.window = window
+        self.averaging = averaging
+        self.alpha = alpha
+        self._state = {}
+
+    def reset(self):
+        self._state = {}
+
+    def update(self, key, volts, dt):
+        """
+        Adds one acquisition (1-D) or several (2-D, one per row) of `key`.
+        Returns (freqs, averaged RMS volts, acquisitions averaged).
+        """
+        freqs, mag = rms_spectrum(volts, dt, self.window)
+        return self.add(key, freqs, mag, dt)
+
+    def add(self, key, freqs, mag, dt):
+        """Same as update() for spectra already computed with rms_spectrum (e.g. on the analysis pool)."""
+        batch = mag if mag.ndim == 2 else mag[np.newaxis, :]
+        sig = (batch.shape[1], float(dt), self.window, self.averaging)
+
+        st = self._state.get(key)
+        if st is None or st['sig'] != sig or self.averaging == "none":
+            st = {'sig': sig, 'count': 0, 'acc': None}
+            self._state[key] = st
+
+        if self.averaging == "linear":
+            power = np.einsum('ij,ij->j', batch, batch)
+            st['acc'] = power if st['acc'] is None else st['acc'] + power
+            st['count'] += batch.shape[0]
+            result = np.sqrt(st['acc'] / st['count'])
+        elif self.averaging == "exponential":
+            acc = st['acc']
+            for row in batch:
+                power = row * row
+                acc = power if acc is None else acc + self.alpha * (power - acc)
+            st['acc'] = acc
+            st['count'] += batch.shape[0]
+            result = np.sqrt(acc)
+        elif self.averaging == "peak":
+            peak = batch.max(axis=0)
+            st['acc'] = peak if st['acc'] is None else np.maximum(st['acc'], peak)
+            st['count'] += batch.shape[0]
+            result = st['acc']
+        else:
+            st['count'] = batch.shape[0]
+            result = batch[-1]
+        return freqs, result, st['count']
@@ -0,0 +1,150 @@
+import json
+import struct
+import time
+
+import numpy as np
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+from PyQt6.QtNetwork import QHostAddress, QTcpServer
+
+DEFAULT_STREAM_PORT = 7540
+
+# Frame layout (little endian):
+#   header:  magic(4s) | type(B) | reserved(3x) | payload length(I) | timestamp(d)
+#   payload: type specific, see encode_* below
+FRAME_MAGIC = b'OSF1'
+FRAME_HEADER = struct.Struct('<4sB3xId')
+FRAME_SCREENSHOT = 1    # raw PNG bytes
+FRAME_MEASUREMENTS = 2  # UTF-8 JSON list of {'p', 'source', 'type', 'value'}
+FRAME_WAVEFORM = 3      # WAVEFORM_HEADER + float32 volts
+WAVEFORM_HEADER = struct.Struct('<8sddI')  # channel, dt, t0, points
+
+
+def encode_frame(frame_type, payload, timestamp=None):
+    ts = time.time() if timestamp is None else timestamp
+    return FRAME_HEADER.pack(FRAME_MAGIC, frame_type, len(payload), ts) + payload
+
+
+def encode_waveform(wf):
+    volts = np.ascontiguousarray(wf.volts, dtype='<f4')
+    return WAVEFORM_HEADER.pack(wf.channel.encode('ascii')[:8], wf.dt, wf.t0, len(volts)) + volts.tobytes()
+
+
+def decode_waveform(payload):
+    """Returns (channel, dt, t0, volts) from a FRAME_WAVEFORM payload."""
+    channel, dt, t0, n = WAVEFORM_HEADER.unpack_from(payload)
+    volts = np.frombuffer(payload, dtype='<f4', count=n, offset=WAVEFORM_HEADER.size)
+    return channel.rstrip(b'\0').decode('ascii'), dt, t0, volts
+
+
+def read_frames(sock):
+    """
+    Generator for subscribers using a plain blocking socket:
+    yields (frame_type, timestamp, payload) until the publisher closes the connection.
+    """
+    def read_exact(n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                return None
+            buf += chunk
+        return bytes(buf)
+
+    while True:
+        header = read_exact(FRAME_HEADER.size)
+        if header is None:
+            return
+        magic, frame_type, length, ts = FRAME_HEADER.unpack(header)
+        if magic != FRAME_MAGIC:
+            raise ValueError("Stream out of sync: bad frame magic.")
+        payload = read_exact(length)
+        if payload is None:
+            return
+        yield frame_type, ts, payload
+
+
+class StreamPublisher(QObject):
+    """
+    Fans out the worker's screenshots, measurements and waveforms to any number of
+    TCP subscribers, so only one process polls the instrument. A subscriber whose
+    socket still has more than `max_backlog` unsent bytes skips frames instead of
+    slowing down the producer.
+    """
+    clients_changed = pyqtSignal(int)
+    error = pyqtSignal(str)
+
+    def __init__(self, max_backlog=4 * 1024 * 1024, parent=None):
+        super().__init__(parent)
+        self.max_backlog = max_backlog
+        self.server = QTcpServer(self)
+        self.server.newConnection.connect(self._on_new_connection)
+        self.clients = []
+        self.dropped_frames = 0
+        self._last_frames = {}
+
+    def start(self, port=DEFAULT_STREAM_PORT, allow_lan=False):
+        """
+        Listens on localhost only unless allow_lan is set (there is no authentication,
+        so a LAN bind exposes the instrument data to anyone on the network).
+        """
+        address = QHostAddress(QHostAddress.SpecialAddress.Any if allow_lan else QHostAddress.SpecialAddress.LocalHost)
+        if not self.server.listen(address, port):
+            self.error.emit(f"Stream server error: {self.server.errorString()}")
+            return False
+        return True
+
+    def address(self):
+        """Bound address as 'host:port' (empty if not listening)."""
+        if not self.server.isListening():
+            return ""
+        return f"{self.server.serverAddress().toString()}:{self.server.serverPort()}"
+
+    def stop(self):
+        self.server.close()
+        for sock in list(self.clients):
+            sock.abort()
+        self.clients = []
+        self._last_frames = {}
+        self.clients_changed.emit(0)
+
+    def is_running(self):
+        return self.server.isListening()
+
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            sock = self.server.nextPendingConnection()
+            sock.disconnected.connect(lambda s=sock: self._on_disconnected(s))
+            self.clients.append(sock)
+            # New subscribers get the latest frame of each type right away
+            for frame in self._last_frames.values():
+                sock.write(frame)
+        self.clients_changed.emit(len(self.clients))
+
+    def _on_disconnected(self, sock):
+        if sock in self.clients:
+            self.clients.remove(sock)
+            sock.deleteLater()
+            self.clients_changed.emit(len(self.clients))
+
+    def _publish(self, key, frame):
+        self._last_frames[key] = frame
+        for sock in self.clients:
+            if sock.bytesToWrite() > self.max_backlog:
+                self.dropped_frames += 1
+                continue
+            sock.write(frame)
+
+    @pyqtSlot(bytes)
+    def publish_screenshot(self, png_data):
+        if self.is_running():
+            self._publish('screenshot', encode_frame(FRAME_SCREENSHOT, png_data))
+
+    @pyqtSlot(list)
+    def publish_measurements(self, results):
+        if self.is_running():
+            self._publish('measurements', encode_frame(FRAME_MEASUREMENTS, json.dumps(results).encode('utf-8')))
+
+    @pyqtSlot(object)
+    def publish_waveform(self, wf):
+        if self.is_running():
+            self._publish(f'waveform:{wf.channel}', encode_frame(FRAME_WAVEFORM, encode_waveform(wf)))
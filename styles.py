@@ -59,3 +59,7 @@ STYLE_MAIN = """
     #heartbeat_on { background-color: #3fb950; border-radius: 5px; }
     #heartbeat_off { background-color: #30363d; border-radius: 5px; }
 """
+
+# Trace colors matching the channel accents above
+TRACE_COLORS = {"C1": "#e3b341", "C2": "#f85149", "C3": "#58a6ff", "C4": "#3fb950",
+                "M1": "#d2a8ff", "M2": "#ffa657", "M3": "#56d4dd", "M4": "#f0f6fc"}
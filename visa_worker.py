@@ -1,9 +1,44 @@
 import pyvisa
-from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
 from PyQt6.QtGui import QImage
 import pyvisa.errors
 import time
 import os
+import math
+import numpy as np
+
+from waveform import Waveform, parse_waveform, write_bundle_entry, write_bundle_settings
+from session_record import RecordingInstrument, ReplayInstrument, parse_replay_address
+from math_channels import MathEngine, write_math_bundle
+
+# Every synced setting in one message; the reply doubles as a cheap change fingerprint
+SETTINGS_FINGERPRINT_KEYS = (['TIME_DIV']
+                             + [f'{ch}:{item}' for ch in ["C1", "C2", "C3", "C4"]
+                                for item in ["TRACE", "VOLT_DIV", "OFFSET", "COUPLING", "BANDWIDTH_LIMIT", "INVERT", "TRIG_LEVEL"]]
+                             + ['TRIG_MODE', 'TRIG_SELECT'])
+SETTINGS_FINGERPRINT_QUERY = ';'.join(f'{k}?' for k in SETTINGS_FINGERPRINT_KEYS)
+
+HARDCOPY_FULL = 'HCSU DEV, PNG, PORT, REMOTE'
+HARDCOPY_COMPACT = 'HCSU DEV, PNG, AREA, GRIDAREAONLY, PORT, REMOTE'
+
+
+class WaveformWriteTask(QRunnable):
+    """Decodes and writes one channel of a bundle export on the worker's thread pool."""
+
+    def __init__(self, channel, raw_data, bundle_dir, results, errors):
+        super().__init__()
+        self.channel = channel
+        self.raw_data = raw_data
+        self.bundle_dir = bundle_dir
+        self.results = results
+        self.errors = errors
+
+    def run(self):
+        try:
+            self.results[self.channel] = write_bundle_entry(self.channel, self.raw_data, self.bundle_dir)
+        except Exception as e:
+            self.errors.append(f"{self.channel}: {str(e)}")
+
 
 class OscilloscopeWorker(QObject):
     """Worker class for true QThread VISA communication. No threading module allowed."""
@@ -11,11 +46,17 @@ class OscilloscopeWorker(QObject):
     error = pyqtSignal(str)
     response = pyqtSignal(str)
     screenshot_ready = pyqtSignal(QImage)
+    screenshot_data = pyqtSignal(bytes)
     measure_ready = pyqtSignal(list)
+    measure_values_ready = pyqtSignal(float, list)
     export_finished = pyqtSignal(str)
     settings_ready = pyqtSignal(dict)
+    settings_changed = pyqtSignal(dict)
     refresh_cycle_complete = pyqtSignal()
     busy_state = pyqtSignal(bool)
+    waveform_ready = pyqtSignal(object)
+    setup_captured = pyqtSignal(str, dict, bytes)
+    setup_recalled = pyqtSignal(str, str, float)
 
     def __init__(self):
         super().__init__()
@@ -23,6 +64,15 @@ class OscilloscopeWorker(QObject):
         self.instrument = None
         self._is_connected = False
         self._is_busy = False
+        self._write_pool = QThreadPool()
+        self._write_pool.setMaxThreadCount(4)
+        self._waveform_window = None
+        self._hardcopy_setup = HARDCOPY_FULL
+        self._hardcopy_active = None
+        self._settings_fingerprint = None
+        self._fingerprint_settings = {}
+        self._record_path = None
+        self._idn = ""
 
     def _safety_check_command(self, cmd: str) -> bool:
         """
@@ -58,6 +108,38 @@ class OscilloscopeWorker(QObject):
 
         return True
 
+    def _set_waveform_window(self, first_point=0, num_points=0, sparsing=0):
+        """
+        Configures which part of the record the next WAVEFORM? transfers (WAVEFORM_SETUP).
+        num_points=0 and sparsing=0 select the full record. Skipped if already active.
+        """
+        window = (first_point, num_points, sparsing)
+        if window != self._waveform_window:
+            self.instrument.write(f'WAVEFORM_SETUP SP,{sparsing},NP,{num_points},FP,{first_point},SN,0')
+            self._waveform_window = window
+
+    def _hold_acquisition(self):
+        """
+        Stops a running acquisition (AUTO / NORM) so that several channels are read from
+        the same trigger. Returns the trigger mode to restore, or None if nothing was stopped.
+        """
+        mode = self.instrument.query('TRIG_MODE?').strip().upper()
+        if not mode.startswith(('AUTO', 'NORM')):
+            return None
+        self.instrument.write('STOP')
+        self.instrument.query('*OPC?')
+        return mode
+
+    def _release_acquisition(self, mode):
+        """
+        Restores the trigger mode stopped by _hold_acquisition if it is still STOP.
+        A mode set meanwhile (e.g. SINGLE from the control session) is kept.
+        """
+        if mode is None:
+            return
+        if self.instrument.query('TRIG_MODE?').strip().upper().startswith('STOP'):
+            self.instrument.write(f'TRIG_MODE {mode}')
+
     @pyqtSlot()
     def cleanup(self):
         """Safely restore instrument state and close VISA resources."""
@@ -67,6 +149,7 @@ class OscilloscopeWorker(QObject):
         
         try:
             self.instrument.write('HCSU DEV, PNG, PORT, PRINT')
+            self._hardcopy_active = None
             self.instrument.write('VBS "app.Hardcopy.AutoSave = ""None"""')
             self.instrument.write('*GTL') # Go To Local 
         except pyvisa.errors.VisaIOError as e:
@@ -86,20 +169,61 @@ class OscilloscopeWorker(QObject):
             self._is_connected = False
             self.instrument = None
             self.rm = None
+            self._record_path = None
+            self._idn = ""
 
     @pyqtSlot(str)
-    def connect_to_scope(self, ip_address):
+    def set_session_recording(self, path):
+        """
+        Starts recording the VISA traffic to `path` (from the next connection, or right
+        away if connected); an empty path stops the recording.
+        """
         try:
-            if not self.rm:
-                self.rm = pyvisa.ResourceManager()
-            resource_string = f'TCPIP::{ip_address}::INSTR'
-            self.instrument = self.rm.open_resource(resource_string)
-            self.instrument.timeout = 5000
+            if isinstance(self.instrument, RecordingInstrument):
+                self.instrument = self.instrument.stop()
+            self._record_path = path or None
+            if self._record_path and self.instrument is not None:
+                self.instrument = RecordingInstrument(self.instrument, self._record_path)
+                if self._is_connected:
+                    # Same opening sequence as connect_to_scope, so the file replays on its own
+                    self.instrument.log_connect(self._idn, ('COMM_HEADER OFF', HARDCOPY_FULL))
+        except Exception as e:
+            self._record_path = None
+            self.error.emit(f"System Error in set_session_recording: {str(e)}")
+
+    @pyqtSlot(str, int)
+    def connect_to_scope(self, ip_address, handshake_ms=0):
+        """
+        Opens the session and identifies the instrument. handshake_ms > 0 (an address
+        that just answered a LAN scan) shortens the open / *IDN? timeout from 5 s.
+        """
+        try:
+            replay = parse_replay_address(ip_address)
+            if replay:
+                # Recorded session instead of an instrument: replay:<path> or replay@<scale>:<path>
+                self.instrument = ReplayInstrument(*replay)
+            else:
+                if not self.rm:
+                    self.rm = pyvisa.ResourceManager()
+                resource_string = f'TCPIP::{ip_address}::INSTR'
+                if handshake_ms > 0:
+                    self.instrument = self.rm.open_resource(resource_string, open_timeout=handshake_ms)
+                else:
+                    self.instrument = self.rm.open_resource(resource_string)
+            if self._record_path:
+                self.instrument = RecordingInstrument(self.instrument, self._record_path)
+            self.instrument.timeout = handshake_ms if handshake_ms > 0 else 5000
             
             self.instrument.clear()
             idn = self.instrument.query('*IDN?')
+            self._idn = idn
+            self.instrument.timeout = 5000
             self.instrument.write('COMM_HEADER OFF')
-            self.instrument.write('HCSU DEV, PNG, PORT, REMOTE')
+            self.instrument.write(HARDCOPY_FULL)
+            self._hardcopy_active = HARDCOPY_FULL
+            self._waveform_window = None
+            self._settings_fingerprint = None
+            self._fingerprint_settings = {}
             
             self._is_connected = True
             self.connected.emit(idn.strip())
@@ -164,8 +288,17 @@ class OscilloscopeWorker(QObject):
             self._is_busy = False
             self.busy_state.emit(False)
 
-    @pyqtSlot(tuple)
-    def get_screenshot(self, target_size):
+    @pyqtSlot(bool)
+    def set_compact_hardcopy(self, compact):
+        """Selects the grid-area-only hardcopy (smaller PNG) for the next screenshots."""
+        self._hardcopy_setup = HARDCOPY_COMPACT if compact else HARDCOPY_FULL
+
+    @pyqtSlot()
+    def get_screenshot(self):
+        """
+        Captures the screen (SCDP). The raw PNG is emitted on screenshot_data, the decoded
+        full-resolution image on screenshot_ready (the monitor widget does the scaling).
+        """
         if not self._is_connected:
             self.error.emit("Error in get_screenshot: Instrument not connected.")
             return
@@ -176,8 +309,11 @@ class OscilloscopeWorker(QObject):
 
         self._is_busy = True
         try:
-            self.instrument.write('HCSU DEV, PNG, PORT, REMOTE')
-            time.sleep(0.15)
+            # The hardcopy setup only needs time to settle when it actually changes
+            if self._hardcopy_active != self._hardcopy_setup:
+                self.instrument.write(self._hardcopy_setup)
+                self._hardcopy_active = self._hardcopy_setup
+                time.sleep(0.15)
             self.instrument.write('SCDP')
             
             old_to = self.instrument.timeout
@@ -199,15 +335,11 @@ class OscilloscopeWorker(QObject):
                 if img.isNull():
                     self.error.emit("Error in get_screenshot: Failed to render image (Null Image).")
                     return
-                
-                if target_size and len(target_size) == 2 and target_size[0] > 0 and target_size[1] > 0:
-                    from PyQt6.QtCore import Qt
-                    img = img.scaled(
-                        target_size[0], target_size[1],
-                        Qt.AspectRatioMode.KeepAspectRatio,
-                        Qt.TransformationMode.SmoothTransformation
-                    )
-                
+                # Decoded here, off the GUI thread, in the format QPainter draws fastest
+                if img.format() != QImage.Format.Format_RGB32:
+                    img.convertTo(QImage.Format.Format_RGB32)
+
+                self.screenshot_data.emit(bytes(image_data))
                 self.screenshot_ready.emit(img)
             else:
                 self.error.emit("Error in get_screenshot: PNG header not found in the response.")
@@ -251,6 +383,146 @@ class OscilloscopeWorker(QObject):
         finally:
             self._is_busy = False
 
+    @pyqtSlot(list)
+    def read_measurement_values(self, p_indices):
+        """
+        Reads the results of already configured measurement slots in a single query
+        (no reconfiguration) and emits them with a time.monotonic() timestamp.
+        """
+        if not self._is_connected:
+            self.error.emit("Error in read_measurement_values: Instrument not connected.")
+            return
+
+        if self._is_busy:
+            self.error.emit("Error in read_measurement_values: Worker busy.")
+            return
+
+        self._is_busy = True
+        try:
+            expr = ' & "," & '.join(f"app.Measure.P{i}.Out.Result.Value" for i in p_indices)
+            reply = self.instrument.query(f"VBS? 'Return={expr}'")
+            t = time.monotonic()
+            values = []
+            for v in reply.strip().split(','):
+                try: values.append(float(v))
+                except ValueError: values.append(float('nan'))
+            self.measure_values_ready.emit(t, values)
+        except pyvisa.errors.VisaIOError as e:
+            self._is_connected = False
+            self.error.emit(f"VISA Error in read_measurement_values: {str(e)}")
+        except Exception as e:
+            self.error.emit(f"System Error in read_measurement_values: {str(e)}")
+        finally:
+            self._is_busy = False
+
+    def _read_settings(self, caller="fetch_all_settings"):
+        """Queries timebase, channel and trigger settings. Failed queries are reported (as `caller`) and skipped."""
+        s = {}
+        # 1. Timebase
+        try: 
+            s['TIME_DIV'] = self.instrument.query("TIME_DIV?").strip()
+        except pyvisa.errors.VisaIOError as e: 
+            self.error.emit(f"VISA Error in {caller} (TIME_DIV): {str(e)}")
+        except Exception as e: 
+            self.error.emit(f"System Error in {caller} (TIME_DIV): {str(e)}")
+
+        # 2. Channels
+        for ch in ["C1", "C2", "C3", "C4"]:
+            try: s[f'{ch}:TRACE'] = self.instrument.query(f"{ch}:TRACE?").strip()
+            except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in {caller} ({ch}:TRACE): {str(e)}")
+            except Exception as e: self.error.emit(f"System Error in {caller} ({ch}:TRACE): {str(e)}")
+            
+            try: s[f'{ch}:VOLT_DIV'] = self.instrument.query(f"{ch}:VOLT_DIV?").strip()
+            except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in {caller} ({ch}:VOLT_DIV): {str(e)}")
+            except Exception as e: self.error.emit(f"System Error in {caller} ({ch}:VOLT_DIV): {str(e)}")
+            
+            try: s[f'{ch}:OFFSET'] = self.instrument.query(f"{ch}:OFFSET?").strip()
+            except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in {caller} ({ch}:OFFSET): {str(e)}")
+            except Exception as e: self.error.emit(f"System Error in {caller} ({ch}:OFFSET): {str(e)}")
+            
+            try: s[f'{ch}:COUPLING'] = self.instrument.query(f"{ch}:COUPLING?").strip()
+            except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in {caller} ({ch}:COUPLING): {str(e)}")
+            except Exception as e: self.error.emit(f"System Error in {caller} ({ch}:COUPLING): {str(e)}")
+            
+            try: s[f'{ch}:BANDWIDTH_LIMIT'] = self.instrument.query(f"{ch}:BANDWIDTH_LIMIT?").strip()
+            except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in {caller} ({ch}:BANDWIDTH_LIMIT): {str(e)}")
+            except Exception as e: self.error.emit(f"System Error in {caller} ({ch}:BANDWIDTH_LIMIT): {str(e)}")
+            
+            try: s[f'{ch}:INVERT'] = self.instrument.query(f"{ch}:INVERT?").strip()
+            except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in {caller} ({ch}:INVERT): {str(e)}")
+            except Exception as e: self.error.emit(f"System Error in {caller} ({ch}:INVERT): {str(e)}")
+
+        # 3. Trigger
+        try: s['TRIG_MODE'] = self.instrument.query("TRIG_MODE?").strip()
+        except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in {caller} (TRIG_MODE): {str(e)}")
+        except Exception as e: self.error.emit(f"System Error in {caller} (TRIG_MODE): {str(e)}")
+        
+        try:
+            trse = self.instrument.query("TRIG_SELECT?").strip().split(',')
+            if len(trse) > 0: s['TRIG_TYPE'] = trse[0]
+            if len(trse) > 2: s['TRIG_SRC'] = trse[2]
+        except pyvisa.errors.VisaIOError as e: 
+            self.error.emit(f"VISA Error in {caller} (TRIG_SELECT): {str(e)}")
+        except Exception as e: 
+            self.error.emit(f"System Error in {caller} (TRIG_SELECT): {str(e)}")
+
+        # Trigger Level
+        if 'TRIG_SRC' in s and s['TRIG_SRC'] in ["C1","C2","C3","C4"]:
+            try: s['TRIG_LVL'] = self.instrument.query(f"{s['TRIG_SRC']}:TRIG_LEVEL?").strip()
+            except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in {caller} (TRIG_LEVEL for {s['TRIG_SRC']}): {str(e)}")
+            except Exception as e: self.error.emit(f"System Error in {caller} (TRIG_LEVEL for {s['TRIG_SRC']}): {str(e)}")
+        return s
+
+    @staticmethod
+    def _parse_fingerprint(reply):
+        """Maps a SETTINGS_FINGERPRINT_QUERY reply to the fetch_all_settings keys, or None if malformed."""
+        values = [v.strip() for v in reply.strip().split(';')]
+        if len(values) != len(SETTINGS_FINGERPRINT_KEYS):
+            return None
+        raw = dict(zip(SETTINGS_FINGERPRINT_KEYS, values))
+        s = {k: v for k, v in raw.items() if not k.endswith(':TRIG_LEVEL') and k != 'TRIG_SELECT'}
+        trse = raw['TRIG_SELECT'].split(',')
+        if len(trse) > 0: s['TRIG_TYPE'] = trse[0]
+        if len(trse) > 2: s['TRIG_SRC'] = trse[2]
+        if s.get('TRIG_SRC') in ["C1", "C2", "C3", "C4"]:
+            s['TRIG_LVL'] = raw[f"{s['TRIG_SRC']}:TRIG_LEVEL"]
+        return s
+
+    @pyqtSlot()
+    def check_settings_changed(self):
+        """
+        Incremental sync: one compound query fingerprints every setting. Nothing is emitted
+        while the reply is unchanged; otherwise only the settings that changed are emitted
+        on settings_changed. Falls back to the full query sweep if the reply is malformed.
+        """
+        if not self._is_connected:
+            return
+
+        if self._is_busy:
+            return
+
+        self._is_busy = True
+        try:
+            reply = self.instrument.query(SETTINGS_FINGERPRINT_QUERY)
+            if reply == self._settings_fingerprint:
+                return
+            s = self._parse_fingerprint(reply)
+            if s is None:
+                s = self._read_settings("check_settings_changed")
+                reply = None
+            changed = {k: v for k, v in s.items() if self._fingerprint_settings.get(k) != v}
+            self._settings_fingerprint = reply
+            self._fingerprint_settings = s
+            if changed:
+                self.settings_changed.emit(changed)
+        except pyvisa.errors.VisaIOError as e:
+            self._is_connected = False
+            self.error.emit(f"VISA Error in check_settings_changed: {str(e)}")
+        except Exception as e:
+            self.error.emit(f"System Error in check_settings_changed: {str(e)}")
+        finally:
+            self._is_busy = False
+
     @pyqtSlot()
     def fetch_all_settings(self):
         if not self._is_connected:
@@ -263,63 +535,9 @@ class OscilloscopeWorker(QObject):
 
         self._is_busy = True
         self.busy_state.emit(True)
-        s = {}
         
         try:
-            # 1. Timebase
-            try: 
-                s['TIME_DIV'] = self.instrument.query("TIME_DIV?").strip()
-            except pyvisa.errors.VisaIOError as e: 
-                self.error.emit(f"VISA Error in fetch_all_settings (TIME_DIV): {str(e)}")
-            except Exception as e: 
-                self.error.emit(f"System Error in fetch_all_settings (TIME_DIV): {str(e)}")
-
-            # 2. Channels
-            for ch in ["C1", "C2", "C3", "C4"]:
-                try: s[f'{ch}:TRACE'] = self.instrument.query(f"{ch}:TRACE?").strip()
-                except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in fetch_all_settings ({ch}:TRACE): {str(e)}")
-                except Exception as e: self.error.emit(f"System Error in fetch_all_settings ({ch}:TRACE): {str(e)}")
-                
-                try: s[f'{ch}:VOLT_DIV'] = self.instrument.query(f"{ch}:VOLT_DIV?").strip()
-                except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in fetch_all_settings ({ch}:VOLT_DIV): {str(e)}")
-                except Exception as e: self.error.emit(f"System Error in fetch_all_settings ({ch}:VOLT_DIV): {str(e)}")
-                
-                try: s[f'{ch}:OFFSET'] = self.instrument.query(f"{ch}:OFFSET?").strip()
-                except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in fetch_all_settings ({ch}:OFFSET): {str(e)}")
-                except Exception as e: self.error.emit(f"System Error in fetch_all_settings ({ch}:OFFSET): {str(e)}")
-                
-                try: s[f'{ch}:COUPLING'] = self.instrument.query(f"{ch}:COUPLING?").strip()
-                except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in fetch_all_settings ({ch}:COUPLING): {str(e)}")
-                except Exception as e: self.error.emit(f"System Error in fetch_all_settings ({ch}:COUPLING): {str(e)}")
-                
-                try: s[f'{ch}:BANDWIDTH_LIMIT'] = self.instrument.query(f"{ch}:BANDWIDTH_LIMIT?").strip()
-                except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in fetch_all_settings ({ch}:BANDWIDTH_LIMIT): {str(e)}")
-                except Exception as e: self.error.emit(f"System Error in fetch_all_settings ({ch}:BANDWIDTH_LIMIT): {str(e)}")
-                
-                try: s[f'{ch}:INVERT'] = self.instrument.query(f"{ch}:INVERT?").strip()
-                except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in fetch_all_settings ({ch}:INVERT): {str(e)}")
-                except Exception as e: self.error.emit(f"System Error in fetch_all_settings ({ch}:INVERT): {str(e)}")
-
-            # 3. Trigger
-            try: s['TRIG_MODE'] = self.instrument.query("TRIG_MODE?").strip()
-            except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in fetch_all_settings (TRIG_MODE): {str(e)}")
-            except Exception as e: self.error.emit(f"System Error in fetch_all_settings (TRIG_MODE): {str(e)}")
-            
-            try:
-                trse = self.instrument.query("TRIG_SELECT?").strip().split(',')
-                if len(trse) > 0: s['TRIG_TYPE'] = trse[0]
-                if len(trse) > 2: s['TRIG_SRC'] = trse[2]
-            except pyvisa.errors.VisaIOError as e: 
-                self.error.emit(f"VISA Error in fetch_all_settings (TRIG_SELECT): {str(e)}")
-            except Exception as e: 
-                self.error.emit(f"System Error in fetch_all_settings (TRIG_SELECT): {str(e)}")
-
-            # Trigger Level
-            if 'TRIG_SRC' in s and s['TRIG_SRC'] in ["C1","C2","C3","C4"]:
-                try: s['TRIG_LVL'] = self.instrument.query(f"{s['TRIG_SRC']}:TRIG_LEVEL?").strip()
-                except pyvisa.errors.VisaIOError as e: self.error.emit(f"VISA Error in fetch_all_settings (TRIG_LEVEL for {s['TRIG_SRC']}): {str(e)}")
-                except Exception as e: self.error.emit(f"System Error in fetch_all_settings (TRIG_LEVEL for {s['TRIG_SRC']}): {str(e)}")
-
+            s = self._read_settings()
             if s: 
                 self.settings_ready.emit(s)
                 
@@ -342,6 +560,7 @@ class OscilloscopeWorker(QObject):
         self._is_busy = True
         try:
             self.instrument.write(f'COMM_FORMAT OFF,WORD,BIN')
+            self._set_waveform_window()
             self.instrument.write(f'{channel}:WAVEFORM? DAT1')
             raw_data = self.instrument.read_raw()
             with open(file_path, 'wb') as f:
@@ -354,3 +573,324 @@ class OscilloscopeWorker(QObject):
             self.error.emit(f"System Error in export_waveform (File save on {channel}): {str(e)}")
         finally:
             self._is_busy = False
+
+    @pyqtSlot(list, str, dict, dict)
+    def export_all_waveforms(self, channels, bundle_dir, settings, math_expressions=None):
+        """
+        Exports several channels into one bundle directory. The transfer of channel N+1
+        overlaps with decoding and writing of channel N on the thread pool.
+        Math channels (name -> expression) are computed from the exported sources, which
+        are read from one held acquisition, and stored with write_math_bundle.
+        """
+        math_expressions = math_expressions or {}
+        if not self._is_connected:
+            self.error.emit("Error in export_all_waveforms: Instrument not connected.")
+            return
+
+        if self._is_busy:
+            self.error.emit("Error in export_all_waveforms: Worker busy.")
+            return
+
+        self._is_busy = True
+        self.busy_state.emit(True)
+        results = {}
+        write_errors = []
+        ch = None
+        held = None
+        try:
+            engine = MathEngine()
+            for name, expression in math_expressions.items():
+                engine.set_expression(name, expression)
+            channels = channels + [src for src in engine.sources() if src not in channels]
+            os.makedirs(bundle_dir, exist_ok=True)
+            self.instrument.write('COMM_FORMAT OFF,WORD,BIN')
+            self._set_waveform_window()
+            if engine.programs:
+                held = self._hold_acquisition()
+            for ch in channels:
+                self.instrument.write(f'{ch}:WAVEFORM? ALL')
+                raw_data = self.instrument.read_raw()
+                self._write_pool.start(WaveformWriteTask(ch, raw_data, bundle_dir, results, write_errors))
+            ch = None
+            self._release_acquisition(held)
+            held = None
+            self._write_pool.waitForDone()
+
+            for err in write_errors:
+                self.error.emit(f"System Error in export_all_waveforms (File save on {err})")
+            write_bundle_settings(bundle_dir, settings, results)
+            math_results = self._export_math(engine, bundle_dir, results)
+            if math_results:
+                write_math_bundle(bundle_dir, math_results, math_expressions)
+            saved = sorted(results) + [wf.channel for wf in math_results]
+            self.export_finished.emit(f"Waveforms {', '.join(saved)} saved to {os.path.basename(bundle_dir)}")
+        except pyvisa.errors.VisaIOError as e:
+            self._is_connected = False
+            self.error.emit(f"VISA Error in export_all_waveforms (Transfer of {ch}): {str(e)}")
+        except Exception as e:
+            self.error.emit(f"System Error in export_all_waveforms: {str(e)}")
+        finally:
+            if held is not None and self._is_connected:
+                try: self._release_acquisition(held)
+                except Exception as e: self.error.emit(f"System Error in export_all_waveforms (Trigger restore): {str(e)}")
+            self._write_pool.waitForDone()
+            self._is_busy = False
+            self.busy_state.emit(False)
+
+    def _export_math(self, engine, bundle_dir, results):
+        """Evaluates the math channels on the exported sources (memory-mapped .npy files)."""
+        for ch, info in results.items():
+            wf = Waveform(ch, np.load(os.path.join(bundle_dir, f"{ch}.npy"), mmap_mode='r'),
+                          info['dt'], info['t0'], info.get('first_point', 0), info.get('sparsing', 1))
+            wf.tag = "export"
+            engine.add(wf)
+        math_results = []
+        for name in engine.programs:
+            try:
+                wf = engine.result(name, "export")
+            except Exception as e:
+                self.error.emit(f"System Error in export_all_waveforms (Math {name}): {str(e)}")
+                continue
+            if wf is not None:
+                math_results.append(wf)
+        return math_results
+
+    @pyqtSlot(list, int, int, int, str, bool)
+    def fetch_waveforms(self, channels, first_point, num_points, sparsing, tag, same_acquisition=False):
+        """
+        Downloads a window of the record (instrument-side decimation via WAVEFORM_SETUP)
+        for each channel and emits the decoded Waveforms, marked with `tag` so the GUI can
+        route them. Use num_points=0, sparsing=0 for the full record. With
+        same_acquisition (math sources) a running acquisition is held for the reads.
+        """
+        if not self._is_connected:
+            self.error.emit("Error in fetch_waveforms: Instrument not connected.")
+            return
+
+        if self._is_busy:
+            self.error.emit("Error in fetch_waveforms: Worker busy.")
+            return
+
+        self._is_busy = True
+        ch = None
+        held = None
+        try:
+            self.instrument.write('COMM_FORMAT OFF,WORD,BIN')
+            self._set_waveform_window(first_point, num_points, sparsing)
+            if same_acquisition and len(channels) > 1:
+                held = self._hold_acquisition()
+            for ch in channels:
+                self.instrument.write(f'{ch}:WAVEFORM? ALL')
+                wf = parse_waveform(self.instrument.read_raw(), ch)
+                wf.tag = tag
+                self.waveform_ready.emit(wf)
+            ch = None
+            self._release_acquisition(held)
+            held = None
+        except pyvisa.errors.VisaIOError as e:
+            self._is_connected = False
+            self.error.emit(f"VISA Error in fetch_waveforms ({ch}): {str(e)}")
+        except Exception as e:
+            self.error.emit(f"System Error in fetch_waveforms ({ch}): {str(e)}")
+        finally:
+            if held is not None and self._is_connected:
+                try: self._release_acquisition(held)
+                except Exception as e: self.error.emit(f"System Error in fetch_waveforms (Trigger restore): {str(e)}")
+            self._is_busy = False
+
+    @pyqtSlot(list, int, float, float, bool)
+    def fetch_waveform_previews(self, channels, max_points, start=0.0, end=1.0, same_acquisition=False):
+        """
+        Downloads at most max_points per channel, sparsed evenly over the visible part
+        of the record (fractions start..end). Emits one Waveform per channel. With
+        same_acquisition (math sources) a running acquisition is held for the reads.
+        """
+        if not self._is_connected:
+            self.error.emit("Error in fetch_waveform_previews: Instrument not connected.")
+            return
+
+        if self._is_busy:
+            self.error.emit("Error in fetch_waveform_previews: Worker busy.")
+            return
+
+        self._is_busy = True
+        ch = None
+        held = None
+        try:
+            record_len = int(float(self.instrument.query('VBS? "Return=app.Acquisition.Horizontal.NumPoints"').strip()))
+            first_point = min(max(0, int(start * record_len)), max(0, record_len - 1))
+            span = max(1, int(math.ceil((end - start) * record_len)))
+            sparsing = max(1, math.ceil(span / max(1, max_points)))
+            self.instrument.write('COMM_FORMAT OFF,WORD,BIN')
+            self._set_waveform_window(first_point, max_points, sparsing)
+            if same_acquisition and len(channels) > 1:
+                held = self._hold_acquisition()
+            for ch in channels:
+                self.instrument.write(f'{ch}:WAVEFORM? ALL')
+                wf = parse_waveform(self.instrument.read_raw(), ch)
+                wf.tag = "preview"
+                self.waveform_ready.emit(wf)
+            ch = None
+            self._release_acquisition(held)
+            held = None
+        except pyvisa.errors.VisaIOError as e:
+            self._is_connected = False
+            self.error.emit(f"VISA Error in fetch_waveform_previews ({ch}): {str(e)}")
+        except Exception as e:
+            self.error.emit(f"System Error in fetch_waveform_previews ({ch}): {str(e)}")
+        finally:
+            if held is not None and self._is_connected:
+                try: self._release_acquisition(held)
+                except Exception as e: self.error.emit(f"System Error in fetch_waveform_previews (Trigger restore): {str(e)}")
+            self._is_busy = False
+
+    @pyqtSlot(str)
+    def capture_setup(self, name):
+        """Reads the current settings plus the complete panel setup blob (PANEL_SETUP?)."""
+        if not self._is_connected:
+            self.error.emit("Error in capture_setup: Instrument not connected.")
+            return
+
+        if self._is_busy:
+            self.error.emit("Error in capture_setup: Worker busy.")
+            return
+
+        self._is_busy = True
+        self.busy_state.emit(True)
+        try:
+            s = self._read_settings("capture_setup")
+            old_to = self.instrument.timeout
+            self.instrument.timeout = 10000
+            try:
+                self.instrument.write('PANEL_SETUP?')
+                blob = self.instrument.read_raw()
+            finally:
+                self.instrument.timeout = old_to
+            self.setup_captured.emit(name, s, bytes(blob))
+        except pyvisa.errors.VisaIOError as e:
+            self._is_connected = False
+            self.error.emit(f"VISA Error in capture_setup (PANEL_SETUP?): {str(e)}")
+        except Exception as e:
+            self.error.emit(f"System Error in capture_setup: {str(e)}")
+        finally:
+            self._is_busy = False
+            self.busy_state.emit(False)
+
+    @pyqtSlot(list, bytes, str)
+    def recall_setup(self, cmds, blob, name=""):
+        """
+        Recalls a setup either as a short list of differing commands or, when cmds is
+        empty, by pushing the panel setup blob in a single transfer. On success emits
+        setup_recalled with the setup name and the latency.
+        """
+        if not self._is_connected:
+            self.error.emit("Error in recall_setup: Instrument not connected.")
+            return
+
+        if self._is_busy:
+            self.error.emit("Error in recall_setup: Worker busy.")
+            return
+
+        self._is_busy = True
+        self.busy_state.emit(True)
+        try:
+            t0 = time.perf_counter()
+            skipped = 0
+            if cmds:
+                mode = f"diff ({len(cmds)} cmds)"
+                for cmd in cmds:
+                    if not self._safety_check_command(cmd):
+                        skipped += 1
+                        continue
+                    self.instrument.write(cmd)
+            else:
+                mode = f"blob ({len(blob)} bytes)"
+                self.instrument.write_raw(b'PANEL_SETUP ' + blob)
+            esr = self.instrument.query("*ESR?").strip()
+            if skipped:
+                self.error.emit(f"Error in recall_setup: {skipped} command(s) blocked by the safety checks, setup '{name}' only partially recalled.")
+                return
+            self.setup_recalled.emit(name, mode, (time.perf_counter() - t0) * 1000.0)
+            self.response.emit(f"Setup recalled | ESR: {esr}")
+        except pyvisa.errors.VisaIOError as e:
+            self._is_connected = False
+            self.error.emit(f"VISA Error in recall_setup: {str(e)}")
+        except Exception as e:
+            self.error.emit(f"System Error in recall_setup: {str(e)}")
+        finally:
+            self._is_busy = False
+            self.busy_state.emit(False)
+
+
+class ControlWorker(QObject):
+    """
+    Second, lightweight VISA session living on its own QThread. Reserved for short
+    control commands (trigger mode, run/stop, clear sweeps) so they reach the
+    instrument while the main worker is busy with long transfers.
+    """
+    connected = pyqtSignal(str)
+    error = pyqtSignal(str)
+    control_ack = pyqtSignal(str, float)
+
+    ALLOWED_PREFIXES = ("TRIG_MODE", "ARM", "STOP", "CLEAR_SWEEPS", "FORCE_TRIGGER")
+
+    def __init__(self):
+        super().__init__()
+        self.rm = None
+        self.instrument = None
+        self._is_connected = False
+
+    @pyqtSlot(str)
+    def connect_to_scope(self, ip_address):
+        # A reconnect replaces the session: close the previous one instead of leaking it
+        if self.instrument is not None:
+            self.cleanup()
+        try:
+            if not self.rm:
+                self.rm = pyvisa.ResourceManager()
+            self.instrument = self.rm.open_resource(f'TCPIP::{ip_address}::INSTR')
+            self.instrument.timeout = 2000
+            self._is_connected = True
+            self.connected.emit(ip_address)
+        except pyvisa.errors.VisaIOError as e:
+            self._is_connected = False
+            self.error.emit(f"VISA Error in control connect_to_scope: {str(e)}")
+        except Exception as e:
+            self._is_connected = False
+            self.error.emit(f"System Error in control connect_to_scope: {str(e)}")
+
+    @pyqtSlot(str)
+    def send_control(self, cmd):
+        """Sends a control command and waits for *OPC? to measure the command-to-ack latency."""
+        if not self._is_connected:
+            self.error.emit(f"Error in send_control: Control session not connected, unable to send {cmd}.")
+            return
+
+        if not cmd.upper().startswith(self.ALLOWED_PREFIXES):
+            self.error.emit(f"Error in send_control: {cmd} is not a control command.")
+            return
+
+        try:
+            t0 = time.perf_counter()
+            self.instrument.write(cmd)
+            self.instrument.query("*OPC?")
+            self.control_ack.emit(cmd, (time.perf_counter() - t0) * 1000.0)
+        except pyvisa.errors.VisaIOError as e:
+            self.error.emit(f"VISA Error in send_control (Execution of {cmd}): {str(e)}")
+        except Exception as e:
+            self.error.emit(f"System Error in send_control (Execution of {cmd}): {str(e)}")
+
+    @pyqtSlot()
+    def cleanup(self):
+        # Only this session: the ResourceManager is shared per VISA library and closing it
+        # would also close the main worker's session. OscilloscopeWorker owns and closes it.
+        try:
+            if self.instrument:
+                self.instrument.close()
+        except pyvisa.errors.VisaIOError as e:
+            self.error.emit(f"VISA Error in control cleanup: {str(e)}")
+        except Exception as e:
+            self.error.emit(f"System Error in control cleanup: {str(e)}")
+        finally:
+            self._is_connected = False
+            self.instrument = None
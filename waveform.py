@@ -0,0 +1,115 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+WAVEDESC_MARKER = b'WAVEDESC'
+
+# Byte offsets inside the WAVEDESC block (LeCroy template LECROY_2_3)
+_COMM_TYPE = 32
+_COMM_ORDER = 34
+_WAVE_DESCRIPTOR = 36
+_USER_TEXT = 40
+_TRIGTIME_ARRAY = 48
+_RIS_TIME_ARRAY = 52
+_RES_ARRAY1 = 56
+_WAVE_ARRAY_1 = 60
+_WAVE_ARRAY_COUNT = 116
+_FIRST_POINT = 132
+_SPARSING_FACTOR = 136
+_VERTICAL_GAIN = 156
+_VERTICAL_OFFSET = 160
+_HORIZ_INTERVAL = 176
+_HORIZ_OFFSET = 180
+
+
+class Waveform:
+    """Decoded waveform: voltage samples plus the horizontal scale needed to rebuild the time axis."""
+
+    def __init__(self, channel, volts, dt, t0, first_point=0, sparsing=1):
+        self.channel = channel
+        self.volts = volts
+        self.dt = dt
+        self.t0 = t0
+        self.first_point = first_point
+        self.sparsing = sparsing
+        self.tag = ""  # consumer of the download (e.g. 'preview', 'spectrum')
+
+    def __len__(self):
+        return len(self.volts)
+
+    @property
+    def times(self):
+        return self.t0 + np.arange(len(self.volts)) * self.dt
+
+    def describe(self):
+        return {
+            'channel': self.channel,
+            'points': len(self.volts),
+            'dt': self.dt,
+            't0': self.t0,
+            'first_point': self.first_point,
+            'sparsing': self.sparsing,
+        }
+
+
+def parse_waveform(raw_data, channel):
+    """
+    Decodes a `<ch>:WAVEFORM? ALL` response (WAVEDESC + DAT1) into a Waveform.
+    Raises ValueError if the descriptor is missing or truncated.
+    """
+    start = raw_data.find(WAVEDESC_MARKER)
+    if start == -1:
+        raise ValueError("WAVEDESC block not found in the response.")
+
+    desc = memoryview(raw_data)[start:]
+    if len(desc) < _HORIZ_OFFSET + 8:
+        raise ValueError("WAVEDESC block is truncated.")
+
+    endian = '<' if desc[_COMM_ORDER] == 1 else '>'
+
+    def field(fmt, offset):
+        return struct.unpack_from(endian + fmt, desc, offset)[0]
+
+    is_word = field('h', _COMM_TYPE) == 1
+    data_offset = (field('l', _WAVE_DESCRIPTOR) + field('l', _USER_TEXT) + field('l', _TRIGTIME_ARRAY)
+                   + field('l', _RIS_TIME_ARRAY) + field('l', _RES_ARRAY1))
+    data_len = field('l', _WAVE_ARRAY_1)
+    if data_offset + data_len > len(desc):
+        raise ValueError("Waveform data block is truncated.")
+
+    dtype = np.dtype(endian + 'i2') if is_word else np.dtype('i1')
+    codes = np.frombuffer(desc, dtype=dtype, count=data_len // dtype.itemsize, offset=data_offset)
+
+    gain = field('f', _VERTICAL_GAIN)
+    offset = field('f', _VERTICAL_OFFSET)
+    volts = codes.astype(np.float32)
+    volts *= gain
+    volts -= offset
+
+    first_point = field('l', _FIRST_POINT)
+    sparsing = max(1, field('l', _SPARSING_FACTOR))
+    interval = field('f', _HORIZ_INTERVAL)
+    t0 = field('d', _HORIZ_OFFSET) + first_point * interval
+
+    return Waveform(channel, volts, interval * sparsing, t0, first_point, sparsing)
+
+
+def write_bundle_entry(channel, raw_data, bundle_dir):
+    """
+    Stores one channel of a multi-channel export: the raw instrument response
+    (`<ch>.bin`) and the decoded volts (`<ch>.npy`). Returns the channel description.
+    """
+    with open(os.path.join(bundle_dir, f"{channel}.bin"), 'wb') as f:
+        f.write(raw_data)
+    wf = parse_waveform(raw_data, channel)
+    np.save(os.path.join(bundle_dir, f"{channel}.npy"), wf.volts)
+    return wf.describe()
+
+
+def write_bundle_settings(bundle_dir, settings, channels_info):
+    """Writes the settings snapshot shared by every channel of the bundle."""
+    snapshot = {'settings': settings, 'channels': dict(sorted(channels_info.items()))}
+    with open(os.path.join(bundle_dir, "settings.json"), 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, indent=2)
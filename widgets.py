@@ -1,6 +1,12 @@
 from PyQt6.QtWidgets import (QGroupBox, QGridLayout, QLabel, QComboBox, 
-                             QDoubleSpinBox, QCheckBox, QPushButton, QMessageBox)
-from PyQt6.QtCore import pyqtSignal
+                             QDoubleSpinBox, QCheckBox, QPushButton, QMessageBox, QWidget,
+                             QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QListWidget,
+                             QListWidgetItem, QDialogButtonBox)
+import numpy as np
+from PyQt6.QtCore import pyqtSignal, Qt, QPointF, QRectF
+from PyQt6.QtGui import QPainter, QPen, QColor, QPolygonF, QPixmap
+
+from styles import TRACE_COLORS
 
 class ChannelControl(QGroupBox):
     settingChanged = pyqtSignal()
@@ -93,3 +99,324 @@ class ChannelControl(QGroupBox):
             "offset": self.offset_sb.value(),
             "invert": "ON" if self.invert_cb.isChecked() else "OFF"
         }
+
+
+class WaveformPlot(QWidget):
+    """
+    Lightweight line plot for decimated traces (previews, spectra, trends).
+
+    With zoomable=True the wheel selects the visible part of the record (fractions
+    start..end, emitted as window_changed) so only that window needs to be downloaded;
+    double-click shows the whole record again.
+    """
+    window_changed = pyqtSignal(float, float)
+    MIN_SPAN = 1e-4
+
+    def __init__(self, x_label="Time (s)", y_label="V", parent=None, zoomable=False):
+        super().__init__(parent)
+        self.x_label = x_label
+        self.y_label = y_label
+        self.traces = {}
+        self.zoomable = zoomable
+        self.window = (0.0, 1.0)
+        self.setMinimumHeight(150)
+
+    def set_trace(self, name, x, y, color=None):
+        """Stores (or replaces) one trace. x and y are equal-length sequences."""
+        self.traces[name] = (x, y, color or TRACE_COLORS.get(name, "#c9d1d9"))
+        self.update()
+
+    def remove_trace(self, name):
+        if self.traces.pop(name, None) is not None:
+            self.update()
+
+    def clear(self):
+        self.traces = {}
+        self.update()
+
+    def set_window(self, start, end):
+        span = min(1.0, max(self.MIN_SPAN, end - start))
+        start = min(max(0.0, start), 1.0 - span)
+        if (start, start + span) != self.window:
+            self.window = (start, start + span)
+            self.window_changed.emit(*self.window)
+
+    def wheelEvent(self, event):
+        if not self.zoomable: return
+        area = QRectF(self.rect()).adjusted(50, 10, -10, -22)
+        start, end = self.window
+        # Zoom around the record position under the cursor
+        anchor = start + (end - start) * min(max((event.position().x() - area.left()) / max(1.0, area.width()), 0.0), 1.0)
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        self.set_window(anchor - (anchor - start) * factor, anchor + (end - anchor) * factor)
+
+    def mouseDoubleClickEvent(self, event):
+        if self.zoomable:
+            self.set_window(0.0, 1.0)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#000000"))
+        area = QRectF(self.rect()).adjusted(50, 10, -10, -22)
+        painter.setPen(QPen(QColor("#30363d"), 1))
+        painter.drawRect(area)
+
+        traces = [(n, x, y, c) for n, (x, y, c) in self.traces.items() if len(x) > 1]
+        if not traces or area.width() <= 0 or area.height() <= 0:
+            painter.setPen(QColor("#484f58"))
+            painter.drawText(area, Qt.AlignmentFlag.AlignCenter, "NO DATA")
+            painter.end()
+            return
+
+        x_min = min(float(np.min(x)) for _, x, _, _ in traces)
+        x_max = max(float(np.max(x)) for _, x, _, _ in traces)
+        y_min = min(float(np.min(y)) for _, _, y, _ in traces)
+        y_max = max(float(np.max(y)) for _, _, y, _ in traces)
+        if x_max <= x_min: x_max = x_min + 1.0
+        if y_max <= y_min: y_min, y_max = y_min - 0.5, y_max + 0.5
+        sx = area.width() / (x_max - x_min)
+        sy = area.height() / (y_max - y_min)
+
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)
+        for name, x, y, color in traces:
+            poly = QPolygonF([QPointF(area.left() + (float(xi) - x_min) * sx, area.bottom() - (float(yi) - y_min) * sy)
+                              for xi, yi in zip(x, y)])
+            painter.setPen(QPen(QColor(color), 1))
+            painter.drawPolyline(poly)
+
+        painter.setPen(QColor("#8b949e"))
+        painter.drawText(QRectF(0, area.top() - 4, 48, 16), Qt.AlignmentFlag.AlignRight, f"{y_max:.3g}")
+        painter.drawText(QRectF(0, area.bottom() - 12, 48, 16), Qt.AlignmentFlag.AlignRight, f"{y_min:.3g}")
+        painter.drawText(QRectF(area.left(), area.bottom() + 4, 120, 16), Qt.AlignmentFlag.AlignLeft, f"{x_min:.4g}")
+        painter.drawText(QRectF(area.right() - 120, area.bottom() + 4, 120, 16), Qt.AlignmentFlag.AlignRight, f"{x_max:.4g}")
+        painter.drawText(QRectF(area.left(), area.bottom() + 4, area.width(), 16), Qt.AlignmentFlag.AlignHCenter,
+                         f"{self.x_label}  |  {self.y_label}  |  " + "  ".join(n for n, _, _, _ in traces)
+                         + (f"  |  {self.window[0] * 100:.2f}-{self.window[1] * 100:.2f} %" if self.window != (0.0, 1.0) else ""))
+        painter.end()
+
+
+class MonitorWidget(QWidget):
+    """
+    Screen monitor that paints the latest frame itself instead of a QLabel pixmap.
+
+    The frame is kept at full resolution; the scaled view is rendered into one
+    widget-sized pixmap that is reused across frames and rebuilt only on a new frame,
+    a resize or a zoom/pan change. Wheel zooms around the cursor, drag pans,
+    double-click restores the fitted view.
+    """
+    MAX_ZOOM = 16.0
+
+    def __init__(self, text="DISCONNECTED", parent=None):
+        super().__init__(parent)
+        self._text = text
+        self._frame = None
+        self._cache = None
+        self._cache_valid = False
+        self._drag_pos = None
+        self.fast = False       # FastTransformation while streaming latency-first
+        self.zoom = 1.0
+        self._center = QPointF()
+        self.setMinimumHeight(450)
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+
+    def set_frame(self, img):
+        if img.isNull(): return
+        if self._frame is None or img.size() != self._frame.size():
+            self._frame = img
+            self.reset_view()
+            return
+        self._frame = img
+        self._invalidate()
+
+    def set_message(self, text):
+        """Text shown while there is no frame (the current frame, if any, stays)."""
+        self._text = text
+        if self._frame is None:
+            self._invalidate()
+
+    def clear(self, text="DISCONNECTED"):
+        self._frame = None
+        self._text = text
+        self._invalidate()
+
+    def set_fast(self, fast):
+        if fast != self.fast:
+            self.fast = fast
+            self._invalidate()
+
+    def reset_view(self):
+        self.zoom = 1.0
+        if self._frame is not None:
+            self._center = QPointF(self._frame.width() / 2.0, self._frame.height() / 2.0)
+        self._invalidate()
+
+    def _invalidate(self):
+        self._cache_valid = False
+        self.update()
+
+    def _scale(self):
+        fit = min(self.width() / self._frame.width(), self.height() / self._frame.height())
+        return fit * self.zoom
+
+    def _clamp_center(self, s):
+        iw, ih = self._frame.width(), self._frame.height()
+        half_w, half_h = self.width() / (2.0 * s), self.height() / (2.0 * s)
+        cx = min(max(self._center.x(), min(half_w, iw / 2.0)), max(iw - half_w, iw / 2.0))
+        cy = min(max(self._center.y(), min(half_h, ih / 2.0)), max(ih - half_h, ih / 2.0))
+        self._center = QPointF(cx, cy)
+
+    def _to_image(self, pos, s):
+        return QPointF(self._center.x() + (pos.x() - self.width() / 2.0) / s,
+                       self._center.y() + (pos.y() - self.height() / 2.0) / s)
+
+    def _render_cache(self, fast):
+        if self._cache is None or self._cache.size() != self.size():
+            self._cache = QPixmap(self.size())
+        self._cache.fill(QColor("#000000"))
+        painter = QPainter(self._cache)
+        if self._frame is None:
+            painter.setPen(QColor("#484f58"))
+            painter.drawText(QRectF(self.rect()), Qt.AlignmentFlag.AlignCenter, self._text)
+        else:
+            s = self._scale()
+            self._clamp_center(s)
+            half_w, half_h = self.width() / (2.0 * s), self.height() / (2.0 * s)
+            view = QRectF(self._center.x() - half_w, self._center.y() - half_h, 2.0 * half_w, 2.0 * half_h)
+            src = view.intersected(QRectF(self._frame.rect()))
+            target = QRectF((src.left() - view.left()) * s, (src.top() - view.top()) * s, src.width() * s, src.height() * s)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, not fast)
+            painter.drawImage(target, self._frame, src)
+            if self.zoom > 1.0:
+                painter.setPen(QColor("#8b949e"))
+                painter.drawText(QRectF(self.rect()).adjusted(0, 8, -14, 0),
+                                 Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignTop, f"ZOOM {self.zoom:.1f}x")
+        painter.end()
+        self._cache_valid = True
+
+    def paintEvent(self, event):
+        if not self._cache_valid or self._cache is None or self._cache.size() != self.size():
+            self._render_cache(self.fast or self._drag_pos is not None)
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._cache)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(QPen(QColor("#30363d"), 2))
+        painter.drawRoundedRect(QRectF(self.rect()).adjusted(1, 1, -1, -1), 12, 12)
+        painter.end()
+
+    def resizeEvent(self, event):
+        self._cache_valid = False
+        super().resizeEvent(event)
+
+    def wheelEvent(self, event):
+        if self._frame is None: return
+        pos = event.position()
+        s = self._scale()
+        anchor = self._to_image(pos, s)
+        factor = 1.25 if event.angleDelta().y() > 0 else 0.8
+        self.zoom = min(self.MAX_ZOOM, max(1.0, self.zoom * factor))
+        s = self._scale()
+        # Keep the image point under the cursor in place
+        self._center = QPointF(anchor.x() - (pos.x() - self.width() / 2.0) / s,
+                               anchor.y() - (pos.y() - self.height() / 2.0) / s)
+        self._invalidate()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton and self._frame is not None and self.zoom > 1.0:
+            self._drag_pos = event.position()
+            self.setCursor(Qt.CursorShape.ClosedHandCursor)
+
+    def mouseMoveEvent(self, event):
+        if self._drag_pos is None: return
+        pos = event.position()
+        s = self._scale()
+        self._center = QPointF(self._center.x() - (pos.x() - self._drag_pos.x()) / s,
+                               self._center.y() - (pos.y() - self._drag_pos.y()) / s)
+        self._drag_pos = pos
+        self._invalidate()
+
+    def mouseReleaseEvent(self, event):
+        if self._drag_pos is None: return
+        self._drag_pos = None
+        self.unsetCursor()
+        self._invalidate()
+
+    def mouseDoubleClickEvent(self, event):
+        if self._frame is not None:
+            self.reset_view()
+
+
+class DiscoveryDialog(QDialog):
+    """
+    Instrument picker for the LAN scan. Results are appended as the hosts answer;
+    double-click or OK takes the selected address.
+    """
+    scan_requested = pyqtSignal(str)
+    cancel_requested = pyqtSignal()
+
+    def __init__(self, targets, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Find Instruments")
+        self.resize(560, 380)
+        self._scanning = False
+        self.found = {}     # host -> probe result
+        lay = QVBoxLayout(self)
+
+        row = QHBoxLayout()
+        row.addWidget(QLabel("Targets:"))
+        self.targets_input = QLineEdit(targets)
+        self.targets_input.setToolTip("Networks (10.0.10.0/24), ranges (10.0.10.20-60) or addresses, comma-separated")
+        self.targets_input.returnPressed.connect(self.toggle_scan)
+        row.addWidget(self.targets_input)
+        self.scan_btn = QPushButton("SCAN")
+        self.scan_btn.clicked.connect(self.toggle_scan)
+        row.addWidget(self.scan_btn)
+        lay.addLayout(row)
+
+        self.results = QListWidget()
+        self.results.itemDoubleClicked.connect(lambda _: self.accept())
+        lay.addWidget(self.results)
+
+        self.status_lbl = QLabel("Idle")
+        lay.addWidget(self.status_lbl)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        lay.addWidget(buttons)
+
+    def toggle_scan(self):
+        if self._scanning:
+            self.cancel_requested.emit()
+            self.status_lbl.setText("Stopping...")
+            return
+        self.results.clear()
+        self._scanning = True
+        self.scan_btn.setText("STOP")
+        self.status_lbl.setText("Scanning...")
+        self.scan_requested.emit(self.targets_input.text())
+
+    def add_result(self, result):
+        self.found[result['host']] = result
+        via = "/".join(result['via'])
+        item = QListWidgetItem(f"{result['host']:<16} {result['idn'] or '(no *IDN? reply)'}   [{via}, {result['ms']:.0f} ms]")
+        item.setData(Qt.ItemDataRole.UserRole, result['host'])
+        self.results.addItem(item)
+        if self.results.currentRow() < 0:
+            self.results.setCurrentRow(0)
+
+    def set_progress(self, done, total):
+        self.status_lbl.setText(f"Scanning... {done}/{total} hosts, {self.results.count()} found")
+
+    def on_finished(self, n_found, seconds):
+        self._scanning = False
+        self.scan_btn.setText("SCAN")
+        self.status_lbl.setText(f"Scan done: {n_found} instrument(s) in {seconds:.2f} s")
+
+    def on_error(self, err):
+        self._scanning = False
+        self.scan_btn.setText("SCAN")
+        self.status_lbl.setText(err)
+
+    def selected_host(self):
+        item = self.results.currentItem()
+        return item.data(Qt.ItemDataRole.UserRole) if item is not None else None